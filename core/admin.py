@@ -1,4 +1,4 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.urls import path
 from django.shortcuts import render
 from django.db.models import Count
@@ -13,10 +13,27 @@ from leaflet.admin import LeafletGeoAdmin
 # Import Models
 # ==============================
 from .models import *
+from .approvals import approve_applications
+from .bulk import suppress_recompute
+
+
+class BulkRecomputeMixin:
+    """
+    Changelist POSTs (actions, delete_selected, list_editable saves) touch many
+    rows at once: run them under suppress_recompute so the per-row recompute
+    receivers are paid once, for the touched workers (see core/bulk.py).
+    """
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'POST':
+            return super().changelist_view(request, extra_context)
+        with suppress_recompute():
+            return super().changelist_view(request, extra_context)
+
 # ==============================
 # LeafletGeoAdmin for models with locations
 # ==============================
-class WorkerAdmin(LeafletGeoAdmin):
+class WorkerAdmin(BulkRecomputeMixin, LeafletGeoAdmin):
     list_display = ('user', 'location', 'is_available', 'allows_cod', 'experience_years', 'approved_at')
 
 class AuthenticatedUserAdmin(LeafletGeoAdmin):
@@ -35,19 +52,36 @@ class UserRoleAdmin(admin.ModelAdmin):
 class ServiceAdmin(admin.ModelAdmin):
     list_display = ("service_type", "description", "base_coins_cost")
 
-class WorkerApplicationAdmin(LeafletGeoAdmin):
+class WorkerApplicationAdmin(BulkRecomputeMixin, LeafletGeoAdmin):
     list_display = ('name', 'email', 'application_status', 'applied_at')
     list_filter = ('application_status',)
     default_lon = 77.5946  # Example default longitude
     default_lat = 12.9716  # Example default latitude
     default_zoom = 12
     geom_field = "Location"
+    actions = ['approve_selected']
+
+    @admin.action(description="Approve selected applications (bulk)")
+    def approve_selected(self, request, queryset):
+        report = approve_applications(queryset.values_list('pk', flat=True))
+        failed = report['failed']
+        self.message_user(
+            request,
+            f"Approved {report['approved']} applications, {report['skipped']} already approved, {len(failed)} failed.",
+            messages.WARNING if failed else messages.SUCCESS,
+        )
+        for app_id, reason in sorted(failed.items())[:20]:
+            self.message_user(request, f"Application {app_id}: {reason}", messages.ERROR)
+        if len(failed) > 20:
+            self.message_user(request, f"... and {len(failed) - 20} more failures", messages.ERROR)
+
+
 @admin.register(WorkerService)
-class WorkerServiceAdmin(admin.ModelAdmin):
+class WorkerServiceAdmin(BulkRecomputeMixin, admin.ModelAdmin):
     list_display = ("worker", "service", "charge")
     search_fields = ("worker__user__email", "service__service_type")
 
-class BookingAdmin(LeafletGeoAdmin):
+class BookingAdmin(BulkRecomputeMixin, LeafletGeoAdmin):
     list_display = ('user', 'worker', 'service', 'status', 'booking_time', 'payment_method', 'payment_received')
     list_filter = ('status', 'payment_method')
     # Specify which GIS field to show the map for
@@ -56,6 +90,13 @@ class BookingAdmin(LeafletGeoAdmin):
     default_zoom = 12
     # Field(s) to show map on
     geom_field = "job_location"
+
+    def save_model(self, request, obj, form, change):
+        # Edits may change status or worker, which the booking counters follow
+        if change:
+            obj.save_status()
+        else:
+            super().save_model(request, obj, form, change)
 class SessionLogAdmin(admin.ModelAdmin):
     list_display = ('user', 'event_type', 'ip_address', 'created_at')
     search_fields = ('ip_address', 'user__email')
@@ -63,7 +104,7 @@ class SessionLogAdmin(admin.ModelAdmin):
 
 
 
-class UserReviewAdmin(admin.ModelAdmin):
+class UserReviewAdmin(BulkRecomputeMixin, admin.ModelAdmin):
     list_display = ('user', 'worker', 'booking', 'rating', 'created_at')
     search_fields = ('comment', 'user__email', 'worker__user__email')
 
@@ -0,0 +1,110 @@
+# core/approvals.py
+import logging
+
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .bulk import note_touched, suppress_recompute
+from .models import AuthenticatedUser, UserRole, Worker, WorkerApplication, sync_worker_services
+
+logger = logging.getLogger(__name__)
+
+# Bulk WorkerApplication approval: the same outcome as saving each application
+# with application_status='approved' (worker role, Worker linked to the
+# application, WorkerService links for its categories), but per chunk of
+# applications with a handful of set-based queries and bulk inserts. Per-row
+# recompute receivers are deferred to one catch-up (see core/bulk.py).
+
+
+def _approve_chunk(applications):
+    """Approve locked, not yet approved applications; returns (approved ids, {id: reason})."""
+    failures = {}
+    users = {
+        user.email: user.pk
+        for user in AuthenticatedUser.objects.filter(email__in={app.email for app in applications})
+    }
+    claimed = {}   # user id -> application
+    for app in applications:
+        user_id = users.get(app.email)
+        if user_id is None:
+            failures[app.pk] = f"no user with email {app.email}"
+        elif user_id in claimed:
+            failures[app.pk] = f"user already approved through application {claimed[user_id].pk} in this run"
+        else:
+            claimed[user_id] = app
+    if not claimed:
+        return [], failures
+
+    has_role = set(
+        UserRole.objects.filter(user_id__in=claimed, role='worker').values_list('user_id', flat=True)
+    )
+    UserRole.objects.bulk_create([UserRole(user_id=user_id, role='worker') for user_id in claimed if user_id not in has_role])
+
+    existing = {worker.user_id: worker for worker in Worker.objects.filter(user_id__in=claimed)}
+    approved_at = timezone.now()
+    created = Worker.objects.bulk_create([
+        Worker(
+            user_id=user_id,
+            application=app,
+            location=app.location,
+            is_available=True,
+            experience_years=0,
+            approved_at=approved_at,
+        )
+        for user_id, app in claimed.items()
+        if user_id not in existing
+    ])
+    for user_id, worker in existing.items():
+        worker.application = claimed[user_id]
+        worker.location = claimed[user_id].location or worker.location
+    Worker.objects.bulk_update(list(existing.values()), ['application', 'location'])
+
+    approved = [app.pk for app in claimed.values()]
+    WorkerApplication.objects.filter(pk__in=approved).update(application_status='approved')
+    worker_ids = [worker.pk for worker in created] + [worker.pk for worker in existing.values()]
+    sync_worker_services(worker_ids)
+    note_touched(worker_ids=worker_ids, user_ids=list(claimed))
+    return approved, failures
+
+
+def _approve(application_ids):
+    """One transaction over the given ids; returns (approved, skipped, failures)."""
+    with transaction.atomic():
+        applications = list(WorkerApplication.objects.select_for_update().filter(pk__in=application_ids))
+        found = {app.pk for app in applications}
+        pending = [app for app in applications if app.application_status != 'approved']
+        approved, failures = _approve_chunk(pending) if pending else ([], {})
+    failures.update((app_id, "application not found") for app_id in application_ids if app_id not in found)
+    return approved, len(applications) - len(pending), failures
+
+
+def approve_applications(application_ids, chunk_size=500, progress=None):
+    """
+    Approve applications in chunks of ``chunk_size``, one transaction each.
+    Already-approved applications are left alone. A chunk that fails in the
+    database is retried row by row so only the offending rows fail.
+    ``progress(done, total, report)`` is called after every chunk.
+    Returns {'approved': n, 'skipped': n, 'failed': {id: reason}}.
+    """
+    ids = sorted(set(application_ids))
+    report = {'approved': 0, 'skipped': 0, 'failed': {}}
+    with suppress_recompute():
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            try:
+                results = [_approve(chunk)]
+            except DatabaseError:
+                logger.warning("Approval chunk of %d failed, retrying row by row", len(chunk), exc_info=True)
+                results = []
+                for app_id in chunk:
+                    try:
+                        results.append(_approve([app_id]))
+                    except DatabaseError as e:
+                        results.append(([], 0, {app_id: str(e).strip()}))
+            for approved, skipped, failures in results:
+                report['approved'] += len(approved)
+                report['skipped'] += skipped
+                report['failed'].update(failures)
+            if progress is not None:
+                progress(min(start + chunk_size, len(ids)), len(ids), report)
+    return report
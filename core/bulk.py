@@ -0,0 +1,86 @@
+# core/bulk.py
+import logging
+import threading
+from contextlib import ContextDecorator
+
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Bulk writes (imports, populate_fake_data, admin bulk edits, data migrations)
+# would otherwise pay every per-row recompute receiver once per row: booking
+# counters, the UserWorkerData update, rating totals, Worker.save's
+# WorkerService sync, cell staleness and the worker change log. Inside
+# suppress_recompute() those receivers only note the worker/user ids they would
+# have recomputed; when the outermost block exits one set-based catch-up runs
+# for just those ids (after the surrounding transaction commits, if any).
+
+_state = threading.local()
+
+
+def recompute_suppressed():
+    return getattr(_state, 'depth', 0) > 0
+
+
+def note_touched(worker_ids=(), user_ids=()):
+    """Called by suppressed receivers instead of doing their work."""
+    _state.workers.update(worker_id for worker_id in worker_ids if worker_id)
+    _state.users.update(user_id for user_id in user_ids if user_id)
+
+
+class suppress_recompute(ContextDecorator):
+    """
+    Context manager / decorator deferring per-row recompute receivers to one
+    catch-up pass over the touched workers and users. Nests; per thread.
+    """
+
+    def __enter__(self):
+        if not recompute_suppressed():
+            _state.workers, _state.users = set(), set()
+        _state.depth = getattr(_state, 'depth', 0) + 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _state.depth -= 1
+        if _state.depth:
+            return False
+        workers, users = _state.workers, _state.users
+        _state.workers = _state.users = None
+        if not (workers or users):
+            return False
+        try:
+            # Rolled-back blocks drop the callback, and their rows, together
+            transaction.on_commit(lambda: catch_up(workers, users))
+        except Exception:
+            if exc_type is None:
+                raise
+            logger.exception("Catch-up after a failed bulk block failed (%d workers)", len(workers))
+        return False
+
+
+def catch_up(worker_ids, user_ids=()):
+    """Set-based equivalent of every suppressed receiver, for just these ids."""
+    from django.core.cache import cache
+
+    from .db import get_engine
+    from .models import (
+        Worker, mark_workers_cells_stale, sync_worker_services, worker_booking_counts, worker_review_totals,
+    )
+    from .recommend import user_history_cache_key
+    from .versions import bump_workers_version, invalidate_worker_changes
+    from .worker_data import rebuild_worker_data
+
+    worker_ids = sorted(worker_ids)
+    if worker_ids:
+        sync_worker_services(worker_ids)
+        Worker.objects.filter(pk__in=worker_ids).update(
+            completed_bookings=worker_booking_counts('completed'),
+            total_bookings=worker_booking_counts(),
+            **worker_review_totals(),
+        )
+        rebuild_worker_data(get_engine(), worker_ids=worker_ids)
+        mark_workers_cells_stale(worker_ids)
+        bump_workers_version()
+        invalidate_worker_changes()
+    cache.delete_many([user_history_cache_key(user_id) for user_id in user_ids])
+    logger.info("Bulk catch-up recomputed %d workers, %d users", len(worker_ids), len(user_ids))
@@ -0,0 +1,261 @@
+# core/bulk_recommend.py
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from shapely.geometry import Point
+
+from .catalog import WorkerCatalog, catalog_columns
+from .models import UserRecommendation
+from .ranking import NEW_USER_WORKER_REDUCTIONS, take, worker_segments
+from .recommend import candidate_options, rank_candidates, rows_to_columns
+from .utils import haversine_vector
+from .versions import bump_user_version, worker_changes_seq
+
+# Recommendations for many users at once: the worker candidate snapshot is read
+# once, user chunks fan out over a process pool, and each chunk computes its
+# users x workers distance matrix in one vectorised call.
+
+SNAPSHOT_SQL = """
+    SELECT w.id AS worker_id,
+           wu.name AS worker_name,
+           s.id AS service_id,
+           s.service_type AS service_name,
+           ST_Y(w.location::geometry) AS worker_lat,
+           ST_X(w.location::geometry) AS worker_lon,
+           w.completed_bookings AS num_bookings,
+           w.total_bookings AS booking_count,
+           w.average_rating AS total_rating,
+           ws.charge,
+           w.is_available,
+           0 AS service_match
+    FROM workers w
+    LEFT JOIN worker_services ws ON w.id = ws.worker_id
+    LEFT JOIN core_service s ON ws.service_id = s.id
+    LEFT JOIN core_authenticateduser wu ON w.user_id = wu.id
+    WHERE w.is_available = TRUE AND w.location IS NOT NULL
+    ORDER BY w.id
+"""
+
+USERS_SQL = """
+    SELECT u.id AS user_id,
+           ST_Y(u.location::geometry) AS lat,
+           ST_X(u.location::geometry) AS lon,
+           EXISTS (SELECT 1 FROM bookings b WHERE b.user_id = u.id) AS has_bookings,
+           COALESCE(h.past_services, '{}') AS past_services,
+           h.avg_rating
+    FROM core_authenticateduser u
+    LEFT JOIN (
+        SELECT user_id,
+               array_agg(DISTINCT service_id) AS past_services,
+               AVG(COALESCE(total_rating, 0)) AS avg_rating
+        FROM user_worker_data
+        WHERE user_id = ANY(%(user_ids)s)
+        GROUP BY user_id
+    ) h ON h.user_id = u.id
+    WHERE u.id = ANY(%(user_ids)s) AND u.location IS NOT NULL
+"""
+
+
+def load_worker_snapshot(engine):
+    """
+    Candidate rows for every available worker as column arrays (sorted by
+    worker id), their per-worker row offsets and the typed worker catalog
+    (core/catalog.py). 'seq' is the worker change-log position it is current
+    as of (see core/versions.py).
+    """
+    seq = worker_changes_seq()  # read first: changes during the load get replayed
+    with engine.connect() as conn:
+        result = conn.exec_driver_sql(SNAPSHOT_SQL)
+        rows = rows_to_columns(result.keys(), result.fetchall())
+
+    # Rows arrive ordered by worker id, so each worker is one contiguous run
+    _, starts = worker_segments(rows['worker_id'])
+    starts = starts[starts < len(rows['worker_id'])]
+    catalog = catalog_columns(rows, starts)
+    del rows['worker_name']  # interned in the catalog
+    return {
+        'rows': rows,
+        'starts': starts,
+        'counts': np.diff(np.r_[starts, len(rows['worker_id'])]),
+        **catalog,
+        'seq': np.array([seq], dtype=np.int64),
+    }
+
+
+def load_users(engine, user_ids):
+    with engine.connect() as conn:
+        result = conn.exec_driver_sql(USERS_SQL, {'user_ids': list(user_ids)})
+        return [row._asdict() for row in result]
+
+
+def rows_for_workers(starts, counts, workers):
+    """Row indices of the given workers, as one flat array."""
+    sizes = counts[workers]
+    offsets = np.repeat(starts[workers] - np.r_[0, np.cumsum(sizes)[:-1]], sizes)
+    return offsets + np.arange(sizes.sum())
+
+
+def candidate_radius(sorted_km, options):
+    """
+    Radius (km) recommend.fetch_candidates settles on, given the ascending
+    distances of the workers it would count: the first with min_workers in
+    range. None means unbounded.
+    """
+    for radius_km in options['radii_km']:
+        if radius_km is None:
+            return None
+        in_range = int(np.searchsorted(sorted_km, radius_km, side='right'))
+        if min(in_range, options['max_workers']) >= options['min_workers']:
+            return radius_km
+    return None
+
+
+def nearest_workers(distance_km, options, offers=None):
+    """
+    Same rule as recommend.fetch_candidates: widen the radius until min_workers
+    are in range. With offers (require_service), only the workers offering a
+    service count, as the SQL drops the others before counting.
+    """
+    order = np.argsort(distance_km, kind='stable')[:options['max_workers']]
+    sorted_km = distance_km[order]
+    counted = sorted_km if offers is None else sorted_km[offers[order]]
+    radius_km = candidate_radius(counted, options)
+    if radius_km is not None:
+        order = order[:int(np.searchsorted(sorted_km, radius_km, side='right'))]
+    return order
+
+
+# Per-process state for the pool (set by _init_pool)
+_snapshot = None
+_model = None
+
+
+def _init_pool(snapshot, model_version):
+    global _snapshot, _model
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    from .ml_model import LEGACY_VERSION, load_version
+    _snapshot = snapshot
+    # Pinned to the parent's version even if another is promoted mid-run
+    _model = load_version(None if model_version == LEGACY_VERSION else model_version)
+
+
+def recommend_chunk(users, snapshot=None, model=None, top_n=5):
+    """Top-N for a list of user dicts (from load_users) against the snapshot."""
+    snapshot = snapshot if snapshot is not None else _snapshot
+    model = model if model is not None else _model
+    if not users or not len(snapshot['starts']):
+        return [(user['user_id'], []) for user in users]
+
+    options = candidate_options()
+    user_lat = np.array([u['lat'] for u in users])[:, None]
+    user_lon = np.array([u['lon'] for u in users])[:, None]
+    distances = haversine_vector(user_lat, user_lon, snapshot['lat'][None, :], snapshot['lon'][None, :])
+
+    catalog = WorkerCatalog(snapshot)
+    # Workers offering at least one service (what require_service counts)
+    offers = catalog.mask(any_service=True)
+    results = []
+    for i, user in enumerate(users):
+        past_services = user['past_services'] if user['has_bookings'] else []
+        workers = nearest_workers(distances[i], options, offers if past_services else None)
+        cols = catalog.rows(rows_for_workers(snapshot['starts'], snapshot['counts'], workers))
+        point = Point(user['lon'], user['lat'])
+
+        if past_services:
+            has_service = cols['service_id'] != None  # noqa: E711 (object array)
+            cols = take(cols, has_service)
+            cols['service_match'] = np.isin(cols['service_id'], past_services).astype(np.int64)
+        if not len(cols['worker_id']):
+            results.append((user['user_id'], []))
+            continue
+
+        if past_services:
+            recommendations = rank_candidates(cols, point, model, top_n, user_avg_rating=user['avg_rating'])
+        else:
+            recommendations = rank_candidates(cols, point, model, top_n, reductions=NEW_USER_WORKER_REDUCTIONS)
+        results.append((user['user_id'], recommendations))
+    return results
+
+
+def _run_chunk(args):
+    users, top_n = args
+    return recommend_chunk(users, top_n=top_n)
+
+
+def iter_bulk_recommendations(user_ids, engine, model_version, top_n=5, chunk_size=256, processes=None):
+    """
+    Yield (user_id, recommendations) for every user with a location, in chunk
+    order, ranked by the registry's model_version. processes=1 runs in-process.
+    """
+    # Always a fresh read: the app servers' preloaded snapshot dates from their start
+    snapshot = load_worker_snapshot(engine)
+    user_ids = list(user_ids)
+    id_chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+
+    if processes == 1:
+        _init_pool(snapshot, model_version)
+        for ids in id_chunks:
+            yield from recommend_chunk(load_users(engine, ids), top_n=top_n)
+        return
+
+    # Children only do NumPy work; never hand them the parent's DB sockets
+    from django.db import connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_pool, initargs=(snapshot, model_version)) as pool:
+        jobs = ((load_users(engine, ids), top_n) for ids in id_chunks)
+        for chunk in pool.map(_run_chunk, jobs):
+            yield from chunk
+
+
+def write_to_table(results, model_version='', batch_size=500):
+    """Upsert results into user_recommendations; returns the number of users written."""
+    written = 0
+    batch = []
+    for user_id, recommendations in results:
+        batch.append(UserRecommendation(
+            user_id=user_id,
+            recommendations=recommendations,
+            computed_at=timezone.now(),
+            is_stale=False,
+            model_version=model_version,
+        ))
+        if len(batch) >= batch_size:
+            written += _flush(batch)
+            batch = []
+    if batch:
+        written += _flush(batch)
+    return written
+
+
+def _flush(batch):
+    UserRecommendation.objects.bulk_create(
+        batch,
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['recommendations', 'computed_at', 'is_stale', 'model_version'],
+    )
+    # bulk_create skips post_save, so move the ETag/SSE version by hand
+    for entry in batch:
+        bump_user_version(entry.user_id)
+    return len(batch)
+
+
+def write_to_jsonl(results, path, model_version=''):
+    written = 0
+    computed_at = timezone.now()
+    with open(path, 'w', encoding='utf-8') as fh:
+        for user_id, recommendations in results:
+            fh.write(json.dumps({
+                'user_id': user_id,
+                'recommendations': recommendations,
+                'computed_at': computed_at,
+                'model_version': model_version,
+            }, cls=DjangoJSONEncoder) + "\n")
+            written += 1
+    return written
@@ -0,0 +1,149 @@
+# core/catalog.py
+import sys
+
+import numpy as np
+
+from .utils import haversine_vector
+
+# Typed per-worker catalog carried by the worker snapshot (core/bulk_recommend.py):
+# one entry per available worker as parallel arrays instead of the candidate
+# rows' object columns. Coordinates, rating and cheapest charge are float32,
+# booking counts int32, services a uint64 bitmask (one bit per service id, 64
+# per word) and names are interned into one list. It is derived from the
+# snapshot's single query, so bulk runs, cold-start cells and the preloaded
+# shared-memory segment (which seeds the request path's spatial index) all hold
+# and filter through the same arrays. Its version is the snapshot's change-log
+# position ('seq'); the spatial index refreshes incrementally from there.
+
+CATALOG_KEYS = (
+    'lat', 'lon', 'rating', 'charge', 'completed', 'total', 'name_code', 'names', 'services', 'service_bits',
+)
+
+
+def catalog_columns(rows, starts):
+    """
+    Catalog arrays for snapshot rows (one run of rows per worker, starting at
+    ``starts``); worker names become name_code into the interned names.
+    """
+    n = len(starts)
+    counts = np.diff(np.r_[starts, len(rows['worker_id'])]).astype(np.int64)
+    has_service = rows['service_id'] != None  # noqa: E711 (object array)
+
+    # One bit per distinct service id, in ascending id order
+    service_ids = rows['service_id'][has_service].astype(np.int64)
+    service_bits = np.unique(service_ids)
+    services = np.zeros((n, max(1, -(-len(service_bits) // 64))), dtype=np.uint64)
+    if len(service_ids):
+        bits = np.searchsorted(service_bits, service_ids)
+        owner = np.repeat(np.arange(n), counts)[has_service]
+        np.bitwise_or.at(services, (owner, bits // 64), np.left_shift(np.uint64(1), (bits % 64).astype(np.uint64)))
+
+    codes = {}
+    name_code = np.array([codes.setdefault(name, len(codes)) for name in rows['worker_name'][starts].tolist()],
+                         dtype=np.int32)
+    names = np.empty(len(codes), dtype=object)
+    names[:] = list(codes)
+
+    return {
+        'lat': rows['worker_lat'][starts].astype(np.float32),
+        'lon': rows['worker_lon'][starts].astype(np.float32),
+        'rating': rows['total_rating'][starts].astype(np.float32),
+        # Cheapest service; NaN for workers without one
+        'charge': (np.fmin.reduceat(rows['charge'], starts) if n else np.zeros(0)).astype(np.float32),
+        'completed': rows['num_bookings'][starts].astype(np.int32),
+        'total': rows['booking_count'][starts].astype(np.int32),
+        'name_code': name_code,
+        'names': names,
+        'services': services,
+        'service_bits': service_bits,
+    }
+
+
+class WorkerCatalog:
+    """Vectorised queries over a snapshot's catalog arrays (a view; nothing is copied)."""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def __len__(self):
+        return len(self.snapshot['starts'])
+
+    @property
+    def version(self):
+        return int(self.snapshot['seq'][0])
+
+    def service_mask(self, service_ids):
+        """Bitmask words for the given service ids (unknown ids match nothing)."""
+        bits = self.snapshot['service_bits']
+        mask = np.zeros(self.snapshot['services'].shape[1], dtype=np.uint64)
+        for service_id in service_ids:
+            bit = int(np.searchsorted(bits, service_id))
+            if bit < len(bits) and bits[bit] == service_id:
+                mask[bit // 64] |= np.uint64(1) << np.uint64(bit % 64)
+        return mask
+
+    def mask(self, services=None, all_services=False, any_service=False,
+             min_rating=None, max_charge=None, min_completed=None):
+        """
+        Boolean mask over workers offering any (or, with all_services, every)
+        service in ``services`` -- or any service at all with any_service -- and
+        within the rating/charge/completed bounds.
+        """
+        snapshot = self.snapshot
+        keep = np.ones(len(self), dtype=bool)
+        if any_service:
+            keep &= snapshot['services'].any(axis=1)
+        if services is not None:
+            mask = self.service_mask(services)
+            hits = snapshot['services'] & mask
+            if all_services:
+                known = all(service_id in snapshot['service_bits'] for service_id in services)
+                keep &= (hits == mask).all(axis=1) & known
+            else:
+                keep &= hits.any(axis=1)
+        if min_rating is not None:
+            keep &= snapshot['rating'] >= min_rating
+        if max_charge is not None:
+            keep &= snapshot['charge'] <= max_charge
+        if min_completed is not None:
+            keep &= snapshot['completed'] >= min_completed
+        return keep
+
+    def filter(self, near=None, radius_km=None, **conditions):
+        """Positions of workers matching mask(**conditions), within radius_km of ``near`` (lat, lon) if given."""
+        positions = np.flatnonzero(self.mask(**conditions))
+        if near is not None and radius_km is not None:
+            distance_km = haversine_vector(near[0], near[1], self.snapshot['lat'][positions],
+                                           self.snapshot['lon'][positions])
+            positions = positions[distance_km <= radius_km]
+        return positions
+
+    def service_ids(self, position):
+        """Service ids offered by the worker at ``position``."""
+        words = self.snapshot['services'][position]
+        bits = np.arange(len(self.snapshot['service_bits']))
+        offered = (words[bits // 64] >> (bits % 64).astype(np.uint64)) & np.uint64(1)
+        return self.snapshot['service_bits'][offered.astype(bool)].tolist()
+
+    def rows(self, index):
+        """Candidate rows at ``index`` (snapshot row indices), with worker_name decoded."""
+        snapshot = self.snapshot
+        cols = {name: values[index] for name, values in snapshot['rows'].items()}
+        positions = np.arange(len(snapshot['rows']['worker_id']))[index]
+        owner = np.searchsorted(snapshot['starts'], positions, side='right') - 1
+        cols['worker_name'] = snapshot['names'][snapshot['name_code'][owner]]
+        return cols
+
+    def memory(self):
+        """Bytes per column (rows.* are the candidate rows, names the interned strings), total and per 100k workers."""
+        usage = {f"rows.{name}": values.nbytes for name, values in self.snapshot['rows'].items()}
+        usage.update((name, self.snapshot[name].nbytes) for name in CATALOG_KEYS if name != 'names')
+        usage.update((name, self.snapshot[name].nbytes) for name in ('starts', 'counts'))
+        names = self.snapshot['names'].tolist()
+        usage['names'] = self.snapshot['names'].nbytes + sum(sys.getsizeof(name) for name in names if name is not None)
+        total = sum(usage.values())
+        return {
+            'columns': usage,
+            'total_bytes': total,
+            'bytes_per_100k_workers': total * 100_000 / len(self) if len(self) else None,
+        }
@@ -0,0 +1,188 @@
+# core/cold_start.py
+import math
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import Q
+from django.utils import timezone
+
+from .bulk_recommend import candidate_radius, load_worker_snapshot, nearest_workers, rows_for_workers
+from .catalog import WorkerCatalog
+from .geogrid import cell_centre, cell_for, cold_start_options, neighbourhood
+from .models import CellRecommendation
+from .ranking import NEW_USER_WORKER_REDUCTIONS, take
+from .recommend import (
+    CANDIDATE_DTYPES, candidate_options, get_user_context, rank_candidates, recommend_top_n_for_user_new,
+)
+from .utils import haversine_vector
+
+# Cold-start candidates: a new user's ranking depends only on their location,
+# so each grid cell stores the rows of the best workers_per_cell workers for a
+# user at its centre, plus the search radius fetch_candidates settles on there.
+# A lookup unions the user's cell with its neighbours, keeps rows within that
+# radius and ranks them exactly as recommend_top_n_for_user_new would.
+
+USER_LOCATIONS_SQL = """
+    SELECT ST_Y(location::geometry) AS lat, ST_X(location::geometry) AS lon
+    FROM core_authenticateduser
+    WHERE location IS NOT NULL
+"""
+
+
+def user_cells(engine):
+    """Keys of every cell that holds at least one user."""
+    with engine.connect() as conn:
+        return sorted({cell_for(row.lat, row.lon) for row in conn.exec_driver_sql(USER_LOCATIONS_SQL)})
+
+
+def stale_cells():
+    """Cells flagged stale by worker changes, plus those older than max_age_seconds."""
+    max_age = cold_start_options()['max_age_seconds']
+    due = Q(is_stale=True)
+    if max_age:
+        due |= Q(computed_at__lt=timezone.now() - timedelta(seconds=max_age))
+    return list(CellRecommendation.objects.filter(due).values_list('cell', flat=True))
+
+
+def cell_rows(snapshot, key, model, workers_per_cell):
+    """
+    Snapshot row indices of the best workers for a new user at the cell
+    centre, and the candidate radius there.
+    """
+    from shapely.geometry import Point
+
+    lat, lon = cell_centre(key)
+    distance_km = haversine_vector(lat, lon, snapshot['lat'], snapshot['lon'])
+    options = candidate_options()
+    workers = nearest_workers(distance_km, options)
+    rows = rows_for_workers(snapshot['starts'], snapshot['counts'], workers)
+    ranked = rank_candidates(
+        WorkerCatalog(snapshot).rows(rows), Point(lon, lat), model, workers_per_cell,
+        reductions=NEW_USER_WORKER_REDUCTIONS,
+    )
+    best = [record['worker_id'] for record in ranked]
+    best_rows = rows[np.isin(snapshot['rows']['worker_id'][rows], best)]
+    return best_rows, candidate_radius(np.sort(distance_km), options)
+
+
+def to_json_columns(cols):
+    """Column arrays as JSON-safe lists (NaN becomes null, as the candidate SQL returns it)."""
+    columns = {}
+    for name, values in cols.items():
+        as_list = values.tolist()
+        if values.dtype.kind == 'f':
+            as_list = [None if math.isnan(v) else v for v in as_list]
+        columns[name] = as_list
+    return columns
+
+
+def rebuild_cells(engine, model, keys, snapshot=None):
+    """Recompute and upsert the given cells; returns how many were written."""
+    options = cold_start_options()
+    if snapshot is None:
+        snapshot = load_worker_snapshot(engine)
+    has_workers = len(snapshot['starts']) > 0
+    computed_at = timezone.now()
+
+    entries = []
+    for key in keys:
+        candidates, radius_km = {}, None
+        if has_workers:
+            rows, radius_km = cell_rows(snapshot, key, model, options['workers_per_cell'])
+            candidates = to_json_columns(WorkerCatalog(snapshot).rows(rows))
+        entries.append(CellRecommendation(
+            cell=key,
+            candidates=candidates,
+            worker_ids=sorted(set(candidates.get('worker_id', []))),
+            radius_km=radius_km,
+            computed_at=computed_at,
+            is_stale=False,
+        ))
+    CellRecommendation.objects.bulk_create(
+        entries,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['cell'],
+        update_fields=['candidates', 'worker_ids', 'radius_km', 'computed_at', 'is_stale'],
+    )
+    return len(entries)
+
+
+def cell_candidates(lat, lon):
+    """
+    Candidate columns for a new user at (lat, lon) from the precomputed cells
+    around them; None when the user's own cell is missing, stale or empty.
+    """
+    keys = neighbourhood(lat, lon, cold_start_options()['ring'])
+    cells = {
+        cell: (candidates, radius_km)
+        for cell, candidates, radius_km in CellRecommendation.objects
+        .filter(cell__in=keys, is_stale=False)
+        .values_list('cell', 'candidates', 'radius_km')
+    }
+    own_candidates, radius_km = cells.get(keys[0], ({}, None))
+    if not own_candidates.get('worker_id'):
+        return None
+
+    # Neighbouring cells share workers; keep each worker's rows once
+    merged = {}
+    seen = set()
+    for key in keys:
+        columns = cells.get(key, ({}, None))[0]
+        if not columns.get('worker_id'):
+            continue
+        keep = [k for k, worker_id in enumerate(columns['worker_id']) if worker_id not in seen]
+        seen.update(columns['worker_id'])
+        for name, values in columns.items():
+            merged.setdefault(name, []).extend(values[k] for k in keep)
+
+    cols = {
+        name: np.array(values, dtype=CANDIDATE_DTYPES.get(name, object))
+        for name, values in merged.items()
+    }
+    if radius_km is not None:
+        in_range = haversine_vector(lat, lon, cols['worker_lat'], cols['worker_lon']) <= radius_km
+        cols = take(cols, in_range)
+    return cols if len(cols['worker_id']) else None
+
+
+def compare_with_exact(engine, model, user_ids, top_n=5):
+    """
+    Top-N agreement between the cell lookup and the exact new-user path for
+    the given users, plus mean latency of each.
+    """
+    compared = cell_hits = identical = 0
+    overlap = exact_ms = cell_ms = 0.0
+    for user_id in user_ids:
+        context = get_user_context(user_id, engine)
+        if context is None:
+            continue
+        point = context['point']
+
+        started = time.perf_counter()
+        exact = recommend_top_n_for_user_new(user_id, engine, point, top_n, model=model, use_cells=False)
+        exact_ms += (time.perf_counter() - started) * 1000.0
+
+        started = time.perf_counter()
+        cols = cell_candidates(point.y, point.x)
+        approx = rank_candidates(cols, point, model, top_n, reductions=NEW_USER_WORKER_REDUCTIONS) if cols else None
+        cell_ms += (time.perf_counter() - started) * 1000.0
+
+        compared += 1
+        if approx is None:
+            continue
+        cell_hits += 1
+        exact_ids = [r['worker_id'] for r in exact]
+        approx_ids = [r['worker_id'] for r in approx]
+        overlap += len(set(exact_ids) & set(approx_ids)) / max(1, len(exact_ids))
+        identical += exact_ids == approx_ids
+
+    return {
+        'users': compared,
+        'cell_hits': cell_hits,
+        'mean_overlap_at_n': overlap / cell_hits if cell_hits else None,
+        'identical_rankings': identical,
+        'exact_mean_ms': exact_ms / compared if compared else None,
+        'cell_mean_ms': cell_ms / compared if compared else None,
+    }
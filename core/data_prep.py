@@ -1,5 +1,8 @@
 # backend/core/data_prep.py
-import pandas as pd
+import numpy as np
+
+from core.db import get_engine
+from core.utils import haversine_vector
 
 FEATURE_COLS = [
     "worker_lat", "worker_lon", "charge", "num_bookings",
@@ -7,9 +10,15 @@ FEATURE_COLS = [
     "worker_avg_rating", "worker_total_bookings", "user_avg_rating"
 ]
 
-def load_df(engine):
+# Upper edges (km) of distance buckets 0..2; anything beyond the last edge is bucket 3
+DISTANCE_BUCKET_EDGES = np.array([1.0, 3.0, 10.0])
+
+def load_df(engine=None):
+    import pandas as pd  # training only; keep it off the serving import path
+
+    engine = engine or get_engine()
     query = """
-    SELECT 
+    SELECT
         user_id,
         worker_id,
         service_id,
@@ -21,12 +30,12 @@ def load_df(engine):
     FROM user_worker_data;
     """
     df = pd.read_sql(query, engine)
-    
+
     # Fill missing values as needed
     df["num_bookings"] = df["num_bookings"].fillna(0).astype(int)
     df["total_rating"] = df["total_rating"].fillna(0.0)
     df["charge"] = df["charge"].fillna(0)
-    
+
     return df
 
 def worker_stats(df):
@@ -40,3 +49,62 @@ def user_stats(df):
     return df.groupby('user_id').agg(
         user_avg_rating=('total_rating', 'mean')
     ).reset_index()
+
+
+def distance_bucket(distance_km):
+    """Same buckets as the (-1, 1, 3, 10, 100] cut used at training time."""
+    return np.searchsorted(DISTANCE_BUCKET_EDGES, np.asarray(distance_km), side='left')
+
+
+def add_training_features(df):
+    """
+    Training-side features for user_worker_data rows that already carry the
+    user's lat_user/lon_user. Adds every column in FEATURE_COLS.
+    """
+    df = df.merge(worker_stats(df), on='worker_id', how='left')
+    df = df.merge(user_stats(df), on='user_id', how='left')
+
+    df['distance_km'] = haversine_vector(df['lat_user'], df['lon_user'], df['worker_lat'], df['worker_lon'])
+    df['distance_bucket'] = distance_bucket(df['distance_km'])
+
+    past_services = df.groupby('user_id')['service_id'].apply(set).to_dict()
+    df['service_match'] = [
+        int(service_id in past_services.get(user_id, set()))
+        for user_id, service_id in zip(df['user_id'], df['service_id'])
+    ]
+    return df
+
+
+def build_feature_matrix(cand, user_lat, user_lon, user_avg_rating):
+    """
+    Serving-side FEATURE_COLS matrix for all candidate rows of one user.
+
+    ``cand`` maps worker_lat, worker_lon, charge, booking_count, service_match
+    and total_rating to equal-length arrays (a DataFrame works). Returns one
+    C-contiguous float32 block in FEATURE_COLS order, ready for Booster.predict.
+    A missing user_avg_rating (no history) is passed as NaN so LightGBM treats
+    it as missing.
+    """
+    worker_lat = np.asarray(cand['worker_lat'], dtype=np.float64)
+    worker_lon = np.asarray(cand['worker_lon'], dtype=np.float64)
+    distance_km = haversine_vector(user_lat, user_lon, worker_lat, worker_lon)
+
+    # Training rows are one per worker in user_worker_data, so per-worker
+    # aggregates reduce to the worker's own booking count and rating.
+    columns = {
+        "worker_lat": worker_lat,
+        "worker_lon": worker_lon,
+        "charge": cand['charge'],
+        "num_bookings": cand['booking_count'],
+        "distance_km": distance_km,
+        "distance_bucket": distance_bucket(distance_km),
+        "service_match": cand['service_match'],
+        "worker_avg_rating": cand['total_rating'],
+        "worker_total_bookings": cand['booking_count'],
+        "user_avg_rating": np.nan if user_avg_rating is None else user_avg_rating,
+    }
+
+    X = np.empty((len(worker_lat), len(FEATURE_COLS)), dtype=np.float32)
+    for i, col in enumerate(FEATURE_COLS):
+        X[:, i] = columns[col]
+    return X
@@ -0,0 +1,73 @@
+# core/db.py
+import os
+import threading
+
+from django.conf import settings
+
+# Defaults for the shared SQLAlchemy pool, overridable via settings.RECOMMENDER_DB_POOL
+DEFAULT_POOL_OPTIONS = {
+    "pool_size": 5,
+    "max_overflow": 10,
+    "pool_timeout": 30,
+    "pool_recycle": 1800,   # seconds, drop connections before server-side idle timeouts
+    "pool_pre_ping": True,  # health-check a connection before handing it out
+}
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def database_url(alias='default'):
+    from sqlalchemy.engine import URL
+
+    db_settings = settings.DATABASES[alias]
+    return URL.create(
+        "postgresql",
+        username=db_settings['USER'],
+        password=db_settings['PASSWORD'],
+        host=db_settings['HOST'],
+        port=db_settings['PORT'] or None,
+        database=db_settings['NAME'],
+    )
+
+
+def get_engine():
+    """Process-wide pooled engine, created on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                from sqlalchemy import create_engine
+
+                options = {**DEFAULT_POOL_OPTIONS, **getattr(settings, 'RECOMMENDER_DB_POOL', {})}
+                _engine = create_engine(database_url(), **options)
+    return _engine
+
+
+def pool_stats():
+    """Current pool usage, for sizing pool_size/max_overflow."""
+    if _engine is None:
+        return {"initialised": False}
+    pool = _engine.pool
+    return {
+        "initialised": True,
+        "pid": os.getpid(),
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "status": pool.status(),
+    }
+
+
+def _reset_after_fork():
+    # A pre-forked child (gunicorn) must never reuse sockets opened by the master:
+    # drop the inherited pool without closing the parent's connections.
+    global _engine_lock
+    _engine_lock = threading.Lock()
+    if _engine is not None:
+        _engine.dispose(close=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,125 @@
+# core/events.py
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+
+from .db import get_engine
+from .ml_model import get_model
+from .models import Booking, Worker
+from .recommend import get_materialized_recommendations, materialize_recommendations_once
+from .serializer import JobSerializer
+from .versions import recommendation_version, shared_cache, worker_jobs_version
+
+# Server-Sent Events push channel (needs the ASGI application, see serviceplatform/asgi.py).
+# Each stream only reads the cache change counters every check_interval seconds and
+# does real work when one of them moves. The counters must live in a shared cache
+# (see settings.CACHES): with a process-local one a stream never sees changes made
+# by requests served in other processes, so clients are told to poll instead.
+DEFAULT_EVENT_OPTIONS = {
+    "enabled": True,
+    "check_interval": 2.0,
+    "heartbeat_interval": 15.0,
+    "max_stream_seconds": 300,  # EventSource reconnects on its own
+}
+
+TOPICS = ('recommendations', 'jobs')
+
+
+def event_options():
+    return {**DEFAULT_EVENT_OPTIONS, **getattr(settings, 'EVENT_STREAM', {})}
+
+
+def sse_message(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+def user_recommendations_payload(user_id):
+    model = get_model()
+    stored = get_materialized_recommendations(user_id, model_version=model.version)
+    if stored is None:
+        recommendations, computed_at = materialize_recommendations_once(user_id, model, get_engine())
+        stored = {'recommendations': recommendations, 'computed_at': computed_at, 'model_version': model.version}
+    return {'user_id': user_id, **stored}
+
+
+def worker_jobs_payload(worker_id):
+    active_job = Booking.objects.filter(worker_id=worker_id, status='in_progress').first()
+    pending_requests = Booking.objects.filter(worker_id=worker_id, status='booked').order_by('-booking_time')
+    return {
+        'activeJob': JobSerializer(active_job).data if active_job else None,
+        'pendingRequests': JobSerializer(pending_requests, many=True).data,
+        'paymentStatus': active_job.payment_status if active_job else 'pending',
+    }
+
+
+# Counter reads are cache-only; run them on the default executor rather than the
+# one thread shared by every sync view, so open streams don't queue behind requests
+_recommendation_version = sync_to_async(recommendation_version, thread_sensitive=False)
+_worker_jobs_version = sync_to_async(worker_jobs_version, thread_sensitive=False)
+
+
+async def _event_source(user_id, worker_id, topics, options):
+    last_versions = {}
+    started = last_sent = time.monotonic()
+
+    while time.monotonic() - started < options['max_stream_seconds']:
+        if 'recommendations' in topics:
+            version = await _recommendation_version(user_id)
+            if version != last_versions.get('recommendations'):
+                last_versions['recommendations'] = version
+                payload = await sync_to_async(user_recommendations_payload)(user_id)
+                yield sse_message('recommendations', payload)
+                last_sent = time.monotonic()
+
+        if 'jobs' in topics and worker_id is not None:
+            version = await _worker_jobs_version(worker_id)
+            if version != last_versions.get('jobs'):
+                last_versions['jobs'] = version
+                payload = await sync_to_async(worker_jobs_payload)(worker_id)
+                yield sse_message('jobs', payload)
+                last_sent = time.monotonic()
+
+        if time.monotonic() - last_sent >= options['heartbeat_interval']:
+            yield ": keepalive\n\n"
+            last_sent = time.monotonic()
+
+        await asyncio.sleep(options['check_interval'])
+
+
+async def event_stream(request):
+    """
+    GET /api/events/?topics=recommendations,jobs
+
+    Pushes ``recommendations`` events to users and ``jobs`` events (pending
+    requests, active job) to workers whenever the underlying data changes,
+    replacing client-side polling.
+    """
+    if not event_options()['enabled'] or not isinstance(request, ASGIRequest) or not shared_cache():
+        # Under WSGI a stream would hold a sync worker for its whole life, and
+        # without a shared cache it would miss other processes' changes. 204
+        # tells EventSource not to reconnect, and the client polls instead.
+        return HttpResponse(status=204)
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    requested = request.GET.get('topics')
+    topics = {t for t in requested.split(',') if t in TOPICS} if requested else set(TOPICS)
+    worker_id = None
+    if 'jobs' in topics:
+        worker_id = await Worker.objects.filter(user_id=user.pk).values_list('id', flat=True).afirst()
+
+    response = StreamingHttpResponse(
+        _event_source(user.pk, worker_id, topics, event_options()),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # stop nginx from buffering the stream
+    return response
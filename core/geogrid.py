@@ -0,0 +1,56 @@
+# core/geogrid.py
+import math
+
+from django.conf import settings
+
+# Uniform lat/lon grid used to precompute cold-start (new-user) candidates per
+# cell, see core/cold_start.py. Keys carry the cell size so a settings change
+# never mixes cells of different sizes.
+DEFAULT_COLD_START_OPTIONS = {
+    "enabled": True,
+    "cell_size_deg": 0.05,   # ~5.5 km north-south
+    "workers_per_cell": 30,  # best workers kept per cell, scored at the cell centre
+    "ring": 1,               # neighbour rings read at lookup (1 = 3x3 cells)
+    "stale_ring": 2,         # rings around a changed worker marked stale
+    # Booking counts in the stored rows drift without marking cells stale, so
+    # cells older than this are rebuilt as well (None disables)
+    "max_age_seconds": 900,
+}
+
+
+def cold_start_options():
+    return {**DEFAULT_COLD_START_OPTIONS, **getattr(settings, 'RECOMMENDER_COLD_START', {})}
+
+
+def cell_index(lat, lon, size):
+    return math.floor(lat / size), math.floor(lon / size)
+
+
+def cell_key(i, j, size):
+    return f"{size:g}:{i}:{j}"
+
+
+def cell_for(lat, lon, size=None):
+    size = size or cold_start_options()['cell_size_deg']
+    return cell_key(*cell_index(lat, lon, size), size)
+
+
+def neighbourhood(lat, lon, ring, size=None):
+    """Keys of the cell holding (lat, lon) and of every cell within ``ring`` steps, own cell first."""
+    size = size or cold_start_options()['cell_size_deg']
+    i, j = cell_index(lat, lon, size)
+    keys = [cell_key(i, j, size)]
+    keys += [
+        cell_key(i + di, j + dj, size)
+        for di in range(-ring, ring + 1)
+        for dj in range(-ring, ring + 1)
+        if di or dj
+    ]
+    return keys
+
+
+def cell_centre(key):
+    """(lat, lon) of the centre of a cell key."""
+    size, i, j = key.split(':')
+    size = float(size)
+    return (int(i) + 0.5) * size, (int(j) + 0.5) * size
@@ -0,0 +1,155 @@
+# core/inference.py
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+from django.conf import settings
+
+# Micro-batching for ranker inference. Under concurrent load on a threaded WSGI
+# worker many requests call predict on small matrices at the same moment; the
+# batcher gathers them for up to max_wait_ms (or max_batch rows), runs one
+# predict over the stacked matrix and hands each caller its slice. Under ASGI,
+# sync views share one thread (thread-sensitive sync_to_async), so calls arrive
+# one at a time and batching only adds max_wait_ms.
+DEFAULT_BATCHING_OPTIONS = {
+    "enabled": False,
+    "max_batch": 4096,   # rows per combined predict call
+    "max_wait_ms": 2.0,  # how long the first request in a batch waits for company
+}
+
+
+def batching_options():
+    return {**DEFAULT_BATCHING_OPTIONS, **getattr(settings, 'RECOMMENDER_BATCHING', {})}
+
+
+class PredictBatcher:
+    def __init__(self, max_batch, max_wait_ms):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._rows = 0
+        self._max_rows = 0
+        self._last_rows = 0
+        self._requests_per_batch = {}
+
+    def predict(self, model, X):
+        """Blocks until the batch holding X has been scored; returns X's scores."""
+        self._ensure_running()
+        future = Future()
+        self._queue.put((model, X, future))
+        return future.result()
+
+    def _ensure_running(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='predict-batcher', daemon=True)
+                    self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        rows = len(batch[0][1])
+        deadline = time.monotonic() + self.max_wait
+        while rows < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            rows += len(item[1])
+        return batch
+
+    def _run(self):
+        while True:
+            # A hot swap can leave requests for two model versions in one batch
+            groups = {}
+            for item in self._collect():
+                groups.setdefault(id(item[0]), []).append(item)
+            for items in groups.values():
+                self._predict_group(items)
+
+    def _predict_group(self, items):
+        model = items[0][0]
+        sizes = [len(X) for _, X, _ in items]
+        try:
+            X = items[0][1] if len(items) == 1 else np.vstack([X for _, X, _ in items])
+            scores = np.asarray(model.predict(X))
+        except Exception as e:
+            for _, _, future in items:
+                future.set_exception(e)
+            return
+        for (_, _, future), part in zip(items, np.split(scores, np.cumsum(sizes)[:-1])):
+            future.set_result(part)
+        self._record(len(items), sum(sizes))
+
+    def _record(self, n_requests, n_rows):
+        with self._stats_lock:
+            self._batches += 1
+            self._requests += n_requests
+            self._rows += n_rows
+            self._max_rows = max(self._max_rows, n_rows)
+            self._last_rows = n_rows
+            self._requests_per_batch[n_requests] = self._requests_per_batch.get(n_requests, 0) + 1
+
+    def stats(self):
+        with self._stats_lock:
+            batches = self._batches or 1
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "requests": self._requests,
+                "mean_batch_requests": self._requests / batches,
+                "mean_batch_rows": self._rows / batches,
+                "max_batch_rows": self._max_rows,
+                "last_batch_rows": self._last_rows,
+                "requests_per_batch": dict(sorted(self._requests_per_batch.items())),
+            }
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher():
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                options = batching_options()
+                _batcher = PredictBatcher(options['max_batch'], options['max_wait_ms'])
+    return _batcher
+
+
+def predict(model, X):
+    """model.predict(X), through the shared batcher when RECOMMENDER_BATCHING is enabled."""
+    if not batching_options()['enabled']:
+        return model.predict(X)
+    return get_batcher().predict(model, X)
+
+
+def batcher_stats():
+    if _batcher is None:
+        return {"enabled": batching_options()['enabled'], "started": False}
+    return {"enabled": batching_options()['enabled'], "started": True, **_batcher.stats()}
+
+
+def _reset_after_fork():
+    # The batching thread does not survive fork; children start their own
+    global _batcher, _batcher_lock
+    _batcher = None
+    _batcher_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
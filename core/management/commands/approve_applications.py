@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.approvals import approve_applications
+from core.models import WorkerApplication
+
+
+class Command(BaseCommand):
+    help = "Approve worker applications in bulk (chunked transactions, set-based inserts)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help="Application ids to approve")
+        parser.add_argument('--pending', action='store_true', help="Approve every pending application (rejected ones are left alone)")
+        parser.add_argument('--chunk-size', type=int, default=500, help="Applications per transaction")
+
+    def handle(self, *args, **options):
+        ids = list(options['ids'])
+        if options['pending']:
+            ids += WorkerApplication.objects.filter(application_status='pending').values_list('id', flat=True)
+        if not ids:
+            raise CommandError("Give application ids or --pending")
+
+        started = time.perf_counter()
+
+        def progress(done, total, report):
+            self.stdout.write(
+                f"  {done}/{total}: {report['approved']} approved, {report['skipped']} already approved, "
+                f"{len(report['failed'])} failed ({time.perf_counter() - started:.1f}s)"
+            )
+
+        report = approve_applications(ids, options['chunk_size'], progress)
+        for app_id, reason in sorted(report['failed'].items()):
+            self.stderr.write(f"application {app_id}: {reason}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Approved {report['approved']} applications, {report['skipped']} already approved, "
+            f"{len(report['failed'])} failed in {time.perf_counter() - started:.1f}s"
+        ))
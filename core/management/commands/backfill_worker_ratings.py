@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from core.models import Worker, worker_review_totals
+from core.versions import bump_workers_version, invalidate_worker_changes
+
+
+class Command(BaseCommand):
+    help = "Recompute Worker.rating_sum / total_reviews / average_rating from reviews, in id-range batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Workers per UPDATE")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = Worker.objects.aggregate(last=Max('id'))['last'] or 0
+        totals = worker_review_totals()
+
+        started = time.perf_counter()
+        updated = 0
+        for start in range(1, last_id + 1, batch_size):
+            with transaction.atomic():
+                updated += Worker.objects.filter(id__gte=start, id__lt=start + batch_size).update(**totals)
+            self.stdout.write(f"  workers up to id {min(start + batch_size - 1, last_id)}: {updated} updated")
+
+        bump_workers_version()
+        invalidate_worker_changes()
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled ratings of {updated} workers in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,111 @@
+import statistics
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+from shapely.geometry import Point
+
+from core.recommend import rank_candidates
+from core.utils import haversine_vector
+
+
+def synthetic_candidates(n_rows, seed=0):
+    """Candidate columns shaped like fetch_candidates output, ~3 services per worker."""
+    rng = np.random.default_rng(seed)
+    n_workers = max(1, n_rows // 3)
+    worker_ids = rng.integers(1, n_workers + 1, n_rows)
+    return {
+        'worker_id': worker_ids.astype(np.int64),
+        'worker_name': np.array([f"Worker {w}" for w in worker_ids], dtype=object),
+        'service_id': rng.integers(1, 20, n_rows).astype(object),
+        'service_name': np.array([f"Service {s}" for s in rng.integers(1, 20, n_rows)], dtype=object),
+        'worker_lat': rng.uniform(12.0, 13.0, n_rows),
+        'worker_lon': rng.uniform(75.0, 76.0, n_rows),
+        'num_bookings': rng.integers(0, 50, n_rows).astype(np.int64),
+        'booking_count': rng.integers(0, 80, n_rows).astype(np.int64),
+        'total_rating': rng.uniform(0, 5, n_rows),
+        'charge': rng.integers(50, 700, n_rows).astype(np.float64),
+        'is_available': np.ones(n_rows, dtype=bool),
+        'service_match': rng.integers(0, 2, n_rows).astype(np.int64),
+    }
+
+
+def pandas_rank(cand_df, user_point, top_n):
+    """The previous DataFrame ranking path, kept as the benchmark baseline."""
+    cand_df["total_rating"] = cand_df["total_rating"].fillna(0.0).astype(float)
+    cand_df["charge"] = cand_df["charge"].fillna(0.0).astype(float)
+    cand_df["num_bookings"] = cand_df["num_bookings"].fillna(0).astype(int)
+    cand_df['distance_km'] = haversine_vector(
+        user_point.y, user_point.x,
+        cand_df['worker_lat'], cand_df['worker_lon']
+    )
+    cand_df['score'] = (
+        (-1 * cand_df['distance_km']) +
+        cand_df['total_rating'] * 1.0 +
+        cand_df['num_bookings'] * 0.5 +
+        cand_df['service_match'] * 1.0 -
+        cand_df['charge'] * 0.2
+    )
+    cand_df = cand_df.groupby('worker_id', as_index=False).agg({
+        'worker_name': 'first',
+        'service_name': 'first',
+        'worker_lat': 'first',
+        'worker_lon': 'first',
+        'charge': 'mean',
+        'num_bookings': 'sum',
+        'total_rating': 'mean',
+        'is_available': 'first',
+        'distance_km': 'min',
+        'service_match': 'max',
+        'score': 'max'
+    })
+    return cand_df.sort_values('score', ascending=False).head(top_n).to_dict(orient='records')
+
+
+def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000.0)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak / 1024.0
+
+
+class Command(BaseCommand):
+    help = "Benchmark the NumPy ranking core against the previous pandas groupby/sort path"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--top-n', type=int, default=5)
+
+    def handle(self, *args, **options):
+        user_point = Point(75.5, 12.5)
+        top_n = options['top_n']
+        self.stdout.write(f"{'rows':>8} {'path':>7} {'median ms':>10} {'peak KiB':>10}")
+
+        for n_rows in options['sizes']:
+            cols = synthetic_candidates(n_rows)
+            frame = pd.DataFrame(cols)
+
+            # Same candidates through both paths with linear scoring (no ranker)
+            def run_numpy():
+                return rank_candidates(dict(cols), user_point, None, top_n)
+
+            def run_pandas():
+                return pandas_rank(frame.copy(), user_point, top_n)
+
+            expected = [r['worker_id'] for r in run_pandas()]
+            got = [r['worker_id'] for r in run_numpy()]
+            if expected != got:
+                self.stderr.write(f"{n_rows}: top-{top_n} differs: pandas {expected} vs numpy {got}")
+
+            for label, fn in (('pandas', run_pandas), ('numpy', run_numpy)):
+                ms, peak_kib = measure(fn, options['repeat'])
+                self.stdout.write(f"{n_rows:>8} {label:>7} {ms:>10.2f} {peak_kib:>10.0f}")
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.bulk_recommend import iter_bulk_recommendations, write_to_jsonl, write_to_table
+from core.db import get_engine
+from core.ml_model import get_model
+from core.models import AuthenticatedUser
+
+
+class Command(BaseCommand):
+    help = "Compute recommendations for many users at once over a process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, nargs='+', help="User ids (default: every user with a location)")
+        parser.add_argument('--output', default='table',
+                            help="'table' to upsert user_recommendations, or a path to write JSONL")
+        parser.add_argument('--processes', type=int, default=None, help="Pool size (default: CPU count, 1 = in-process)")
+        parser.add_argument('--chunk-size', type=int, default=256, help="Users per pool task")
+        parser.add_argument('--top-n', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be positive")
+
+        user_ids = options['users']
+        if not user_ids:
+            user_ids = list(
+                AuthenticatedUser.objects.filter(location__isnull=False).order_by('id').values_list('id', flat=True)
+            )
+
+        model_version = get_model().version
+        started = time.perf_counter()
+        results = iter_bulk_recommendations(
+            user_ids, get_engine(), model_version,
+            top_n=options['top_n'],
+            chunk_size=options['chunk_size'],
+            processes=options['processes'],
+        )
+        if options['output'] == 'table':
+            written = write_to_table(results, model_version)
+        else:
+            written = write_to_jsonl(results, options['output'], model_version)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote recommendations for {written}/{len(user_ids)} users to {options['output']} in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.ml_model import current_version, list_versions, model_meta, promote, rollback
+
+
+class Command(BaseCommand):
+    help = "List, promote or roll back versions of the recommendation ranker"
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='action', required=True)
+        subparsers.add_parser('list', help="Show registered versions")
+        promote_parser = subparsers.add_parser('promote', help="Serve the given version")
+        promote_parser.add_argument('version')
+        subparsers.add_parser('rollback', help="Go back to the previously promoted version")
+
+    def handle(self, *args, **options):
+        action = options['action']
+        try:
+            if action == 'promote':
+                version = promote(options['version'])
+                self.stdout.write(self.style.SUCCESS(f"Promoted {version}"))
+            elif action == 'rollback':
+                version = rollback()
+                self.stdout.write(self.style.SUCCESS(f"Rolled back to {version}"))
+            else:
+                self.list_versions()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+    def list_versions(self):
+        current = current_version()
+        for version in list_versions():
+            meta = model_meta(version)
+            marker = '*' if version == current else ' '
+            metrics = ", ".join(f"{k}={v:.4f}" for k, v in meta['metrics'].items())
+            self.stdout.write(f"{marker} {version}  {meta['created_at']}  {metrics}")
+        if current is None:
+            self.stdout.write("No version promoted; serving ml_models/lgb_ranker.txt")
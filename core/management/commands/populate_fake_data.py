@@ -10,6 +10,7 @@ from django.contrib.gis.geos import Point
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 django.setup()
 
+from core.bulk import suppress_recompute
 from core.models import (
     AuthenticatedUser, UserRole, Service, WorkerApplication, Worker,
     WorkerService, Booking, UserReview
@@ -153,6 +154,8 @@ def create_reviews(bookings):
                 created_at=booking.completed_at or timezone.now()
             )
 
+# Per-row recompute receivers are deferred to one catch-up pass at the end
+@suppress_recompute()
 def populate_data():
     print("Creating services...")
     services = create_services(20)
@@ -0,0 +1,50 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.cold_start import compare_with_exact, rebuild_cells, stale_cells, user_cells
+from core.db import get_engine
+from core.ml_model import get_model
+from core.models import AuthenticatedUser
+
+
+class Command(BaseCommand):
+    help = "Rebuild precomputed new-user candidates per grid cell (cell_recommendations)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-only', action='store_true',
+                            help="Only rebuild cells flagged stale by worker changes or older than max_age_seconds")
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep rebuilding stale and expired cells every --interval seconds")
+        parser.add_argument('--interval', type=int, default=60)
+        parser.add_argument('--compare', type=int, metavar='USERS', default=0,
+                            help="Afterwards, compare cell lookups with the exact computation for this many users")
+        parser.add_argument('--top-n', type=int, default=5)
+
+    def handle(self, *args, **options):
+        engine = get_engine()
+        model = get_model()
+
+        self.rebuild(engine, model, stale_only=options['stale_only'])
+        while options['loop']:
+            time.sleep(options['interval'])
+            self.rebuild(engine, model, stale_only=True)
+
+        if options['compare']:
+            self.compare(engine, model, options['compare'], options['top_n'])
+
+    def rebuild(self, engine, model, stale_only):
+        started = time.perf_counter()
+        keys = stale_cells() if stale_only else user_cells(engine)
+        written = rebuild_cells(engine, model, keys) if keys else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {written} cells in {time.perf_counter() - started:.1f}s"
+        ))
+
+    def compare(self, engine, model, sample_size, top_n):
+        user_ids = list(AuthenticatedUser.objects.filter(location__isnull=False).values_list('id', flat=True))
+        user_ids = random.sample(user_ids, min(sample_size, len(user_ids)))
+        report = compare_with_exact(engine, model, user_ids, top_n=top_n)
+        for key, value in report.items():
+            self.stdout.write(f"{key:>20}: {value:.3f}" if isinstance(value, float) else f"{key:>20}: {value}")
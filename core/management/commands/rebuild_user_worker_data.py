@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.db import get_engine
+from core.worker_data import rebuild_worker_data
+
+
+class Command(BaseCommand):
+    help = "Rebuild the user_worker_data ML table set-based from bookings, workers and reviews"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Worker ids per INSERT ... SELECT")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def progress(last_id, max_id, written, removed):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"  workers up to id {last_id}/{max_id}: {written} rows written, {removed} removed ({elapsed:.1f}s)"
+            )
+
+        written, removed = rebuild_worker_data(get_engine(), options['batch_size'], progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt user_worker_data: {written} rows written, {removed} removed "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
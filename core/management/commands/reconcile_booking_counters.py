@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+
+from core.models import Worker, worker_booking_counts
+from core.versions import bump_workers_version, record_worker_change
+
+
+class Command(BaseCommand):
+    help = "Recount Worker.completed_bookings / total_bookings from the bookings table and fix any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report workers whose counters are off")
+
+    def handle(self, *args, **options):
+        drifted = (
+            Worker.objects
+            .annotate(actual_completed=worker_booking_counts('completed'), actual_total=worker_booking_counts())
+            .filter(~Q(completed_bookings=F('actual_completed')) | ~Q(total_bookings=F('actual_total')))
+            .values_list('id', 'completed_bookings', 'actual_completed', 'total_bookings', 'actual_total')
+        )
+        rows = list(drifted)
+        for worker_id, completed, actual_completed, total, actual_total in rows[:20]:
+            self.stdout.write(
+                f"worker {worker_id}: completed {completed} -> {actual_completed}, total {total} -> {actual_total}"
+            )
+        if options['dry_run'] or not rows:
+            self.stdout.write(self.style.SUCCESS(f"{len(rows)} workers with drifted counters"))
+            return
+
+        worker_ids = [row[0] for row in rows]
+        with transaction.atomic():
+            fixed = Worker.objects.filter(id__in=worker_ids).update(
+                completed_bookings=worker_booking_counts('completed'),
+                total_bookings=worker_booking_counts(),
+            )
+            transaction.on_commit(bump_workers_version)
+            for worker_id in worker_ids:
+                transaction.on_commit(lambda worker_id=worker_id: record_worker_change(worker_id))
+        self.stdout.write(self.style.SUCCESS(f"Reconciled counters of {fixed} workers"))
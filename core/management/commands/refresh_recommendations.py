@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.db import get_engine
+from core.ml_model import get_model
+from core.recommend import materialize_recommendations, users_needing_refresh
+
+
+class Command(BaseCommand):
+    help = "Recompute stale or missing materialized recommendations (user_recommendations)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=None,
+                            help="Seconds after which an entry counts as old (default: settings)")
+        parser.add_argument('--active-within', type=int, default=None,
+                            help="Only refresh old entries of users who logged in within this many hours")
+        parser.add_argument('--limit', type=int, default=None, help="Refresh at most this many users per pass")
+        parser.add_argument('--loop', action='store_true', help="Keep refreshing every --interval seconds")
+        parser.add_argument('--interval', type=int, default=60)
+
+    def handle(self, *args, **options):
+        while True:
+            self.refresh_once(options)
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def refresh_once(self, options):
+        engine = get_engine()
+        model = get_model()
+        user_ids = users_needing_refresh(options['max_age'], options['active_within'], model.version)
+        if options['limit']:
+            user_ids = user_ids[:options['limit']]
+
+        started = time.perf_counter()
+        failed = 0
+        for user_id in user_ids:
+            try:
+                materialize_recommendations(user_id, model, engine)
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"User {user_id}: {e}")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Refreshed {len(user_ids) - failed}/{len(user_ids)} users in {elapsed:.1f}s"
+        ))
@@ -1,59 +1,25 @@
-import os
 import pandas as pd
-import numpy as np
 import lightgbm as lgb
-from shapely.geometry import Point
-from sqlalchemy import create_engine
-import joblib
 from django.core.management.base import BaseCommand
-from django.conf import settings
+from core.db import get_engine
+from core.data_prep import FEATURE_COLS, add_training_features, load_df
+from core.ml_model import promote, register_model
 
 class Command(BaseCommand):
     help = "Train LightGBM ranking model for service worker recommendations"
 
-    def handle(self, *args, **kwargs):
-        # Get DB config from Django settings
-        db_settings = settings.DATABASES['default']
-        user = db_settings['USER']
-        password = db_settings['PASSWORD']
-        host = db_settings['HOST']
-        port = db_settings['PORT']
-        dbname = db_settings['NAME']
-
-        conn_str = f"postgresql://{user}:{password}@{host}:{port}/{dbname}"
-        engine = create_engine(conn_str)
+    def add_arguments(self, parser):
+        parser.add_argument('--no-promote', action='store_true',
+                            help="Only register the new version; promote it later with model_registry")
 
-        # ----------------------------
-        # Haversine distance function
-        # ----------------------------
-        def haversine_vector(lat1, lon1, lat2, lon2):
-            R = 6371.0
-            dlat = np.radians(lat2 - lat1)
-            dlon = np.radians(lon2 - lon1)
-            a = np.sin(dlat/2)**2 + np.cos(np.radians(lat1)) * np.cos(np.radians(lat2)) * np.sin(dlon/2)**2
-            c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
-            return R * c
+    def handle(self, *args, **kwargs):
+        # Shared pooled engine (same one the recommendation views use)
+        engine = get_engine()
 
         # ----------------------------
         # Load training data
         # ----------------------------
-        df = pd.read_sql("""
-        SELECT 
-            user_id,
-            worker_id,
-            service_id,
-            ST_Y(worker_location::geometry) AS worker_lat,
-            ST_X(worker_location::geometry) AS worker_lon,
-            charge,
-            num_bookings,
-            total_rating
-        FROM user_worker_data;
-        """, engine)
-
-        # Fill missing values
-        df["num_bookings"] = df["num_bookings"].fillna(0).astype(int)
-        df["total_rating"] = df["total_rating"].fillna(0.0)
-        df["charge"] = df["charge"].fillna(0)
+        df = load_df(engine)
 
         # ----------------------------
         # User locations
@@ -66,37 +32,14 @@ class Command(BaseCommand):
         WHERE location IS NOT NULL;
         """, engine)
 
-        user_locs_dict = {row["id"]: Point(row["lon"], row["lat"]) for _, row in user_locs.iterrows()}
-
         # Merge user lat/lon to main df
         df = df.merge(user_locs.set_index('id'), left_on='user_id', right_index=True, how='left')
         df = df.rename(columns={'lat': 'lat_user', 'lon': 'lon_user'})
 
         # ----------------------------
-        # Feature engineering
+        # Feature engineering (shared with serving, see core.data_prep)
         # ----------------------------
-        # Worker stats
-        worker_stats = df.groupby('worker_id').agg(
-            worker_avg_rating=('total_rating', 'mean'),
-            worker_total_bookings=('num_bookings', 'sum')
-        ).reset_index()
-        df = df.merge(worker_stats, on='worker_id', how='left')
-
-        # User stats
-        user_stats = df.groupby('user_id').agg(
-            user_avg_rating=('total_rating', 'mean')
-        ).reset_index()
-        df = df.merge(user_stats, on='user_id', how='left')
-
-        # Distance feature
-        df['distance_km'] = haversine_vector(df['lat_user'], df['lon_user'], df['worker_lat'], df['worker_lon'])
-
-        # Distance bucket
-        df['distance_bucket'] = pd.cut(df['distance_km'], bins=[-1,1,3,10,100], labels=[0,1,2,3]).astype(int)
-
-        # Service match feature
-        past_services = df.groupby('user_id')['service_id'].apply(set).to_dict()
-        df['service_match'] = df.apply(lambda row: int(row['service_id'] in past_services.get(row['user_id'], set())), axis=1)
+        df = add_training_features(df)
 
         # Label for ranking
         df['total_rating_int'] = df['total_rating'].round().astype(int)
@@ -104,12 +47,6 @@ class Command(BaseCommand):
         # ----------------------------
         # Train-validation split
         # ----------------------------
-        FEATURE_COLS = [
-            "worker_lat", "worker_lon", "charge", "num_bookings",
-            "distance_km", "distance_bucket", "service_match",
-            "worker_avg_rating", "worker_total_bookings", "user_avg_rating"
-        ]
-
         from sklearn.model_selection import GroupShuffleSplit
         if df["user_id"].nunique() > 1:
             gss = GroupShuffleSplit(n_splits=1, test_size=0.2, random_state=42)
@@ -169,9 +106,15 @@ class Command(BaseCommand):
         )
 
         # ----------------------------
-        # Save model
+        # Register model (serving processes pick up promoted versions on their own)
         # ----------------------------
-        os.makedirs("ml_models", exist_ok=True)
-        model.save_model("ml_models/lgb_ranker.txt")
-        joblib.dump(FEATURE_COLS, "ml_models/feature_cols.pkl")
-        self.stdout.write(self.style.SUCCESS("✅ Model trained and saved successfully!"))
+        metrics = {
+            f"valid_{name}": values[model.best_iteration - 1] if model.best_iteration else values[-1]
+            for name, values in evals_result.get('valid', {}).items()
+        }
+        version = register_model(model, FEATURE_COLS, metrics)
+        if kwargs['no_promote']:
+            self.stdout.write(self.style.SUCCESS(f"✅ Model trained and registered as {version} (not promoted)"))
+        else:
+            promote(version)
+            self.stdout.write(self.style.SUCCESS(f"✅ Model trained, registered and promoted as {version}"))
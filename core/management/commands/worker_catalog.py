@@ -0,0 +1,50 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from core.bulk_recommend import load_worker_snapshot
+from core.catalog import WorkerCatalog
+from core.db import get_engine
+
+
+class Command(BaseCommand):
+    help = "Load the worker snapshot and report its catalog's size and filter speed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=1000,
+                            help="Random nearby-with-service filters to time against the catalog")
+        parser.add_argument('--radius-km', type=float, default=15.0)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        snapshot = load_worker_snapshot(get_engine())
+        catalog = WorkerCatalog(snapshot)
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {len(catalog)} workers, {len(snapshot['service_bits'])} services, "
+            f"{len(snapshot['names'])} distinct names in {time.perf_counter() - started:.2f}s"
+        ))
+
+        report = catalog.memory()
+        for name, nbytes in report['columns'].items():
+            self.stdout.write(f"{name:>20}: {nbytes / 1024:.1f} KiB")
+        self.stdout.write(f"{'total':>20}: {report['total_bytes'] / 1024:.1f} KiB")
+        if report['bytes_per_100k_workers'] is not None:
+            self.stdout.write(f"{'per 100k workers':>20}: {report['bytes_per_100k_workers'] / 2**20:.2f} MiB")
+
+        if options['queries'] and len(catalog):
+            self.benchmark(catalog, snapshot, options['queries'], options['radius_km'])
+
+    def benchmark(self, catalog, snapshot, queries, radius_km):
+        rng = np.random.default_rng(0)
+        service_ids = snapshot['service_bits'].tolist()
+        matched = 0
+        started = time.perf_counter()
+        for position in rng.integers(len(catalog), size=queries):
+            services = [service_ids[rng.integers(len(service_ids))]] if service_ids else None
+            near = (float(snapshot['lat'][position]), float(snapshot['lon'][position]))
+            matched += len(catalog.filter(services=services, near=near, radius_km=radius_km))
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        self.stdout.write(
+            f"{queries} filters: {elapsed_ms / queries:.3f} ms each, {matched / queries:.1f} workers matched on average"
+        )
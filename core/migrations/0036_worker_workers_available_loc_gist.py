@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2025-10-05 09:12
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0035_userworkerdata_worker_latitude_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='worker',
+            index=django.contrib.postgres.indexes.GistIndex(condition=models.Q(('is_available', True), ('location__isnull', False)), fields=['location'], name='workers_available_loc_gist'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2025-10-05 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0036_worker_workers_available_loc_gist'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userworkerdata',
+            index=models.Index(fields=['user', 'service'], name='uwd_user_service_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2025-10-06 08:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0037_userworkerdata_uwd_user_service_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserRecommendation',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recommendation_cache', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('recommendations', models.JSONField(blank=True, default=list)),
+                ('computed_at', models.DateTimeField()),
+                ('is_stale', models.BooleanField(default=False)),
+            ],
+            options={
+                'db_table': 'user_recommendations',
+                'indexes': [models.Index(fields=['computed_at'], name='user_reco_computed_at_idx')],
+            },
+        ),
+    ]
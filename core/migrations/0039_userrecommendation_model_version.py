@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2025-10-06 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0038_userrecommendation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userrecommendation',
+            name='model_version',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2025-10-06 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0039_userrecommendation_model_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CellRecommendation',
+            fields=[
+                ('cell', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('candidates', models.JSONField(blank=True, default=dict)),
+                ('radius_km', models.FloatField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField()),
+                ('is_stale', models.BooleanField(default=False)),
+            ],
+            options={
+                'db_table': 'cell_recommendations',
+            },
+        ),
+    ]
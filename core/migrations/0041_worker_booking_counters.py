@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2025-10-08 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0040_cellrecommendation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='worker',
+            name='completed_bookings',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='worker',
+            name='total_bookings',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE workers w
+                SET completed_bookings = b.completed, total_bookings = b.total
+                FROM (
+                    SELECT worker_id,
+                           COUNT(*) FILTER (WHERE status = 'completed') AS completed,
+                           COUNT(*) AS total
+                    FROM bookings
+                    WHERE worker_id IS NOT NULL
+                    GROUP BY worker_id
+                ) b
+                WHERE w.id = b.worker_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
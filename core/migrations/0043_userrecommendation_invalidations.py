@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2025-10-09 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0042_worker_rating_sum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userrecommendation',
+            name='invalidations',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
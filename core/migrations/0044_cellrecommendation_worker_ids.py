@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2025-10-09 11:40
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0043_userrecommendation_invalidations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cellrecommendation',
+            name='worker_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE cell_recommendations
+                SET worker_ids = ARRAY(
+                    SELECT DISTINCT value::int
+                    FROM jsonb_array_elements_text(candidates -> 'worker_id') AS value
+                    ORDER BY 1
+                )
+                WHERE jsonb_typeof(candidates -> 'worker_id') = 'array'
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='cellrecommendation',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['worker_ids'], name='cell_reco_worker_ids_gin'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2025-10-10 09:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0044_cellrecommendation_worker_ids'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='userworkerdata',
+            name='uwd_user_service_idx',
+        ),
+        migrations.AddIndex(
+            model_name='userworkerdata',
+            index=models.Index(fields=['user', 'service'], include=['total_rating'], name='uwd_user_service_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2025-10-10 11:05
+
+from django.db import migrations
+
+# 0042 originally added rating_sum without filling it in; databases migrated
+# before its backfill was added get it here (harmless to run twice).
+RATING_TOTALS_SQL = """
+    UPDATE workers w
+    SET rating_sum = r.rating_sum,
+        total_reviews = r.reviews,
+        average_rating = CASE WHEN r.reviews > 0 THEN ROUND(r.rating_sum::numeric / r.reviews, 2) ELSE 0.0 END
+    FROM (
+        SELECT wk.id AS worker_id,
+               COALESCE(SUM(ur.rating), 0) AS rating_sum,
+               COUNT(ur.id) AS reviews
+        FROM workers wk
+        LEFT JOIN core_userreview ur ON ur.worker_id = wk.id AND ur.rating IS NOT NULL
+        GROUP BY wk.id
+    ) r
+    WHERE w.id = r.worker_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0045_uwd_user_service_idx_include_rating'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=RATING_TOTALS_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -1,10 +1,188 @@
-import lightgbm as lgb
+import json
+import logging
 import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../ml_models")
+MODEL_PATH = os.path.join(MODEL_DIR, "lgb_ranker.txt")
+
+# Versioned model registry. Each version is a directory holding the booster and
+# its metadata (feature_cols, metrics); CURRENT names the promoted version and
+# HISTORY lists promotions, newest last, for rollback. Override the location
+# (e.g. a shared volume) via settings.RECOMMENDER_MODEL_REGISTRY.
+DEFAULT_REGISTRY_OPTIONS = {
+    "path": os.path.join(MODEL_DIR, "registry"),
+    "check_interval": 5.0,  # seconds between CURRENT checks in serving processes
+}
+
+LEGACY_VERSION = "legacy"  # the pre-registry ml_models/lgb_ranker.txt
+
+
+def registry_options():
+    return {**DEFAULT_REGISTRY_OPTIONS, **getattr(settings, 'RECOMMENDER_MODEL_REGISTRY', {})}
+
+
+def _registry_path(*parts):
+    return os.path.join(registry_options()['path'], *parts)
+
+
+def _write_atomic(path, text):
+    # Readers see either the old or the new file, never a partial write
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    with os.fdopen(fd, 'w') as fh:
+        fh.write(text)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp_path, path)
 
-MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../ml_models/lgb_ranker.txt")
 
 def load_model():
+    import lightgbm as lgb
     return lgb.Booster(model_file=MODEL_PATH)
 
-# Load model once when this module is imported
-recommendation_model = load_model()
+
+def register_model(booster, feature_cols, metrics=None):
+    """Store a trained booster as a new version; returns the version id."""
+    os.makedirs(_registry_path(), exist_ok=True)
+    created_at = datetime.now(timezone.utc)
+    version = created_at.strftime("%Y%m%d%H%M%S%f")
+
+    staging = tempfile.mkdtemp(dir=_registry_path(), prefix=".tmp-")
+    booster.save_model(os.path.join(staging, "model.txt"))
+    with open(os.path.join(staging, "meta.json"), 'w') as fh:
+        json.dump({
+            'version': version,
+            'feature_cols': list(feature_cols),
+            'metrics': metrics or {},
+            'created_at': created_at.isoformat(),
+        }, fh, indent=2)
+    os.rename(staging, _registry_path(version))
+    return version
+
+
+def model_meta(version):
+    with open(_registry_path(version, "meta.json")) as fh:
+        return json.load(fh)
+
+
+def list_versions():
+    path = _registry_path()
+    if not os.path.isdir(path):
+        return []
+    return sorted(
+        name for name in os.listdir(path)
+        if not name.startswith('.') and os.path.isdir(os.path.join(path, name))
+    )
+
+
+def current_version():
+    """The promoted version, or None when nothing has been promoted yet."""
+    try:
+        with open(_registry_path("CURRENT")) as fh:
+            return fh.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def promotion_history():
+    try:
+        with open(_registry_path("HISTORY")) as fh:
+            return [line.strip() for line in fh if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def check_feature_cols(version, meta):
+    """A version is only servable if it was trained on the features serving builds."""
+    from .data_prep import FEATURE_COLS
+    if meta['feature_cols'] != FEATURE_COLS:
+        raise ValueError(
+            f"Model {version} was trained on {meta['feature_cols']}, serving builds {FEATURE_COLS}"
+        )
+
+
+def promote(version):
+    """Atomically make ``version`` the one serving processes load."""
+    if version not in list_versions():
+        raise ValueError(f"Unknown model version {version!r}")
+    check_feature_cols(version, model_meta(version))
+    history = promotion_history()
+    if not history or history[-1] != version:
+        history.append(version)
+    _write_atomic(_registry_path("HISTORY"), "".join(f"{v}\n" for v in history))
+    _write_atomic(_registry_path("CURRENT"), version)
+    return version
+
+
+def rollback():
+    """Re-promote the version that was live before the current one."""
+    history = promotion_history()
+    if len(history) < 2:
+        raise ValueError("No earlier promoted version to roll back to")
+    history.pop()
+    _write_atomic(_registry_path("HISTORY"), "".join(f"{v}\n" for v in history))
+    _write_atomic(_registry_path("CURRENT"), history[-1])
+    return history[-1]
+
+
+class ServingModel:
+    """A loaded booster plus the registry version it came from."""
+
+    def __init__(self, booster, version, feature_cols=None):
+        self.booster = booster
+        self.version = version
+        self.feature_cols = feature_cols
+
+    def predict(self, X):
+        return self.booster.predict(X)
+
+
+def load_version(version):
+    if version is None:
+        return ServingModel(load_model(), LEGACY_VERSION)
+
+    import lightgbm as lgb
+
+    meta = model_meta(version)
+    check_feature_cols(version, meta)
+    booster = lgb.Booster(model_file=_registry_path(version, "model.txt"))
+    return ServingModel(booster, version, meta['feature_cols'])
+
+
+_active = None
+_last_check = 0.0
+_lock = threading.Lock()
+
+
+def get_model():
+    """
+    The promoted ranker. CURRENT is re-read at most every check_interval seconds
+    and a newly promoted version is swapped in for the next request; if it fails
+    to load, the previous model keeps serving.
+    """
+    global _active, _last_check
+    now = time.monotonic()
+    if _active is not None and now - _last_check < registry_options()['check_interval']:
+        return _active
+
+    with _lock:
+        if _active is None or now - _last_check >= registry_options()['check_interval']:
+            _last_check = now
+            version = current_version()
+            wanted = version or LEGACY_VERSION
+            if _active is None or _active.version != wanted:
+                try:
+                    _active = load_version(version)
+                    logger.info("Serving ranker version %s", _active.version)
+                except Exception:
+                    if _active is None:
+                        raise
+                    logger.exception("Could not load model %s, still serving %s", wanted, _active.version)
+    return _active
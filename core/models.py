@@ -1,17 +1,27 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, GistIndex
 from django.contrib.gis.db import models as gis_models
 from django.utils import timezone
-from django.db.models import Avg, Count
-from django.db.models.signals import post_save, post_delete
+from django.db.models import (
+    Count, ExpressionWrapper, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value,
+)
+from django.db.models.functions import Cast, Coalesce, Greatest, NullIf, Round
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.conf import settings
+from django.core.cache import cache
 from django.contrib.gis.db import models as gis_models
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 from django.utils import timezone
 from phonenumber_field.modelfields import PhoneNumberField  # Use this for proper phone validation
 from django.db.models import Q
+
+from core.bulk import note_touched, recompute_suppressed
+from core.geogrid import cold_start_options, neighbourhood
+from core.versions import bump_user_version, bump_worker_jobs_version, bump_workers_version, record_worker_change
+from core.worker_data import schedule_worker_data
 # ==============================
 # User Management
 # ==============================
@@ -114,9 +124,24 @@ class WorkerApplication(models.Model):
     ], default='pending')
     applied_at = models.DateTimeField(auto_now_add=True)
     verified_at = models.DateTimeField(null=True, blank=True)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Categories the linked worker's services were last synced from, see save()
+        instance._synced_categories = instance.__dict__.get('service_categories')
+        return instance
+
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
 
+        synced = getattr(self, '_synced_categories', None)
+        if synced is not None and self.service_categories != synced:
+            worker_ids = list(Worker.objects.filter(application=self).values_list('id', flat=True))
+            if worker_ids:
+                resync_worker_services(worker_ids)
+        self._synced_categories = list(self.service_categories or [])
+
         if self.application_status == 'approved':
             # Query user by email in AuthenticatedUser
             try:
@@ -159,9 +184,16 @@ class Worker(models.Model):
     approved_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(default=timezone.now, editable=False)
 
-    # Review statistics
+    # Review statistics: running totals moved with F() by the UserReview
+    # receivers (total_reviews is the count); average_rating follows them
     average_rating = models.FloatField(default=0.0)
     total_reviews = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+
+    # Booking counters, kept in step by the Booking receivers and
+    # Booking.save_status (manage.py reconcile_booking_counters repairs drift)
+    completed_bookings = models.PositiveIntegerField(default=0)
+    total_bookings = models.PositiveIntegerField(default=0)
     def active_job(self):
         # Returns the active booking/job assigned to this worker, or None if none exists
         return self.bookings.filter(Q(status='in_progress') | Q(status='active')).first()
@@ -171,33 +203,72 @@ class Worker(models.Model):
         return self.application.name if self.application else ""
 
     def update_average_rating(self):
-        """Recalculate average rating based on all reviews."""
+        """Recalculate rating totals from all reviews (see manage.py backfill_worker_ratings)."""
         reviews = self.userreview_set.filter(rating__isnull=False)
-        agg = reviews.aggregate(avg_rating=models.Avg("rating"), total=models.Count("id"))
+        agg = reviews.aggregate(avg_rating=models.Avg("rating"), total=models.Count("id"), rating_sum=models.Sum("rating"))
         self.average_rating = round(agg["avg_rating"] or 0.0, 2)
         self.total_reviews = agg["total"] or 0
-        self.save(update_fields=["average_rating", "total_reviews"])
+        self.rating_sum = agg["rating_sum"] or 0
+        self.save(update_fields=["average_rating", "total_reviews", "rating_sum"])
+
+    @property
+    def smoothed_rating(self):
+        """Bayesian average: the raw average pulled towards the prior mean while reviews are few."""
+        prior = rating_prior()
+        return (prior['mean'] * prior['weight'] + self.rating_sum) / (prior['weight'] + self.total_reviews)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Application the services were last synced from, see save()
+        instance._synced_application_id = instance.__dict__.get('application_id')
+        # What decides which cold-start cells list the worker, see mark_cells_stale
+        instance._cell_placement = (instance.__dict__.get('location'), instance.__dict__.get('is_available'))
+        return instance
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
-        # Automatically create WorkerService entries from application service categories
-        if self.application and self.application.service_categories:
-            from core.models import Service, WorkerService
-            for service_type in self.application.service_categories:
-                try:
-                    service = Service.objects.get(service_type=service_type)
-                    WorkerService.objects.get_or_create(
-                        worker=self,
-                        service=service,
-                        defaults={'charge': service.base_coins_cost},
-                    )
-                except Service.DoesNotExist:
-                    pass
+        # Create WorkerService entries from the application's service categories,
+        # only when the worker is linked to a different application (category
+        # edits are synced from WorkerApplication.save)
+        application_id = self.__dict__.get('application_id')
+        if application_id is not None and application_id != getattr(self, '_synced_application_id', None):
+            resync_worker_services([self.pk])
+        self._synced_application_id = application_id
 
     class Meta:
         db_table = 'workers'
         verbose_name = 'Worker'
         verbose_name_plural = 'Workers'
+        indexes = [
+            # KNN / ST_DWithin candidate lookup only ever scans available workers
+            GistIndex(
+                fields=['location'],
+                name='workers_available_loc_gist',
+                condition=Q(is_available=True, location__isnull=False),
+            ),
+        ]
+
+
+# Prior for Worker.smoothed_rating: ``weight`` pseudo-reviews of ``mean`` stars
+DEFAULT_RATING_PRIOR = {
+    "mean": 3.5,
+    "weight": 5,
+}
+
+
+def rating_prior():
+    return {**DEFAULT_RATING_PRIOR, **getattr(settings, 'RECOMMENDER_RATING_PRIOR', {})}
+
+
+def smoothed_rating_expression():
+    """Worker.smoothed_rating as a query expression, for annotate()/order_by()."""
+    prior = rating_prior()
+    return ExpressionWrapper(
+        (Value(float(prior['mean'] * prior['weight'])) + F('rating_sum'))
+        / (Value(float(prior['weight'])) + F('total_reviews')),
+        output_field=FloatField(),
+    )
 
 
 class WorkerService(models.Model):
@@ -213,6 +284,49 @@ class WorkerService(models.Model):
         verbose_name_plural = 'Worker Services'
 
 
+def sync_worker_services(worker_ids):
+    """
+    Add the WorkerService rows missing for the workers' application
+    categories, with one service_type__in lookup and one bulk insert.
+    Returns the rows created.
+    """
+    categories = dict(
+        Worker.objects.filter(pk__in=worker_ids, application__isnull=False)
+        .values_list('id', 'application__service_categories')
+    )
+    service_types = {service_type for types in categories.values() for service_type in types or ()}
+    if not service_types:
+        return []
+    # Lowest id wins for duplicate service types
+    services = {s.service_type: s for s in Service.objects.filter(service_type__in=service_types).order_by('-id')}
+    existing = set(
+        WorkerService.objects.filter(worker_id__in=categories).values_list('worker_id', 'service_id')
+    )
+    missing = {}
+    for worker_id, types in categories.items():
+        for service_type in types or ():
+            service = services.get(service_type)
+            if service is not None and (worker_id, service.pk) not in existing:
+                missing[worker_id, service.pk] = WorkerService(
+                    worker_id=worker_id, service=service, charge=service.base_coins_cost,
+                )
+    # ignore_conflicts: a concurrent sync may have inserted the same links
+    return WorkerService.objects.bulk_create(list(missing.values()), ignore_conflicts=True)
+
+
+def resync_worker_services(worker_ids):
+    """sync_worker_services, plus what the WorkerService receivers would do (bulk_create sends no signals)."""
+    if recompute_suppressed():
+        note_touched(worker_ids=worker_ids)
+        return
+    if not sync_worker_services(worker_ids):
+        return
+    bump_workers_version()
+    mark_workers_cells_stale(worker_ids)
+    for worker_id in worker_ids:
+        transaction.on_commit(lambda worker_id=worker_id: record_worker_change(worker_id))
+
+
 # ==============================
 # Bookings & Transactions
 # ==============================
@@ -259,6 +373,38 @@ class Booking(models.Model):
     completed_at = models.DateTimeField(null=True, blank=True)
     details = models.TextField(blank=True, null=True)
 
+    def save_status(self, update_fields=None):
+        """
+        Save a status or worker change of an existing booking and move the
+        workers' booking counters with it, in one transaction; the row lock
+        keeps concurrent transitions of the same booking from counting twice.
+        """
+        with transaction.atomic():
+            previous = (
+                Booking.objects.select_for_update()
+                .filter(pk=self.pk)
+                .values_list('status', 'worker_id')
+                .first()
+            )
+            self.save(update_fields=update_fields)
+            if previous is None:
+                return
+            previous_status, previous_worker_id = previous
+            if previous_worker_id == self.worker_id:
+                delta = (self.status == 'completed') - (previous_status == 'completed')
+                if delta and self.worker_id:
+                    Worker.objects.filter(pk=self.worker_id).update(
+                        completed_bookings=Greatest(F('completed_bookings') + delta, 0),
+                    )
+                return
+            # Assigned, reassigned or unassigned: the booking moves between workers
+            count_booking(previous_worker_id, previous_status, -1)
+            count_booking(self.worker_id, self.status, 1)
+            if previous_worker_id:
+                # post_save only reports the booking's new worker
+                transaction.on_commit(lambda: record_worker_change(previous_worker_id))
+                schedule_worker_data(previous_worker_id)
+
     class Meta:
         db_table = 'bookings' 
         verbose_name = 'Booking'
@@ -350,35 +496,64 @@ class UserWorkerData(models.Model):
     class Meta:
         db_table = "user_worker_data"
         unique_together = ('user', 'worker', 'service')
+        indexes = [
+            # Per-user past-services lookup for recommendations; total_rating is
+            # included so get_user_history is an index-only scan
+            models.Index(fields=['user', 'service'], include=['total_rating'], name='uwd_user_service_idx'),
+        ]
     def __str__(self):
         return f"{self.user} → {self.worker} ({self.service_name})"
 
+def count_booking(worker_id, status, step):
+    """Add (step=1) or remove (step=-1) a booking with this status from the worker's counters."""
+    if not worker_id:
+        return
+    if recompute_suppressed():
+        note_touched(worker_ids=[worker_id])
+        return
+    completed = step if status == 'completed' else 0
+    Worker.objects.filter(pk=worker_id).update(
+        total_bookings=Greatest(F('total_bookings') + step, 0),
+        completed_bookings=Greatest(F('completed_bookings') + completed, 0),
+    )
+
+
+def worker_booking_counts(status=None):
+    """The worker's booking count (of one status) recomputed from bookings, for annotate()/update()."""
+    bookings = Booking.objects.filter(worker=OuterRef('pk'))
+    if status is not None:
+        bookings = bookings.filter(status=status)
+    count = bookings.order_by().values('worker').annotate(n=Count('id')).values('n')
+    return Coalesce(Subquery(count, output_field=IntegerField()), Value(0))
+
+
 @receiver(post_save, sender=Booking)
+def booking_created_counters(sender, instance, created, raw=False, **kwargs):
+    # Status and worker changes of existing bookings go through Booking.save_status
+    if created and not raw:
+        count_booking(instance.worker_id, instance.status, 1)
+
+
+@receiver(post_delete, sender=Booking)
+def booking_deleted_counters(sender, instance, **kwargs):
+    count_booking(instance.worker_id, instance.status, -1)
+
+
+@receiver([post_save, post_delete], sender=Booking)
 def update_worker_data(sender, instance, **kwargs):
-    booking = instance
-    service = booking.service
-    worker = booking.worker
-    user = booking.user
-
-    if worker and service:
-        avg_rating = worker.userreview_set.aggregate(avg=Avg('rating'))['avg'] or 0.0
-
-        UserWorkerData.objects.update_or_create(
-            worker=worker,                   # Use worker for uniqueness
-            defaults={
-                "user": user,               # optional, depending on your model and uniqueness
-                "service": service,         # optional, if a worker can offer multiple services
-                "service_name": service.service_type,
-                "worker_location": worker.location,
-                "worker_experience": worker.experience_years,
-                "charge": booking.tariff_coins or 0,
-                "num_bookings": worker.bookings.count(),
-                "total_rating": avg_rating,
-                "worker_latitude": worker.location.y,   # Latitude from PointField
-                "worker_longitude": worker.location.x,  # Longitude from PointField
-            }
-        )
+    if recompute_suppressed():
+        note_touched(worker_ids=[instance.worker_id], user_ids=[instance.user_id])
+        return
+    # The worker's row follows its latest booking (see core/worker_data.py)
+    if instance.worker_id and instance.service_id:
+        schedule_worker_data(instance.worker_id)
+
 
+@receiver([post_save, post_delete], sender=UserWorkerData)
+def invalidate_user_history(sender, instance, **kwargs):
+    # Keep the recommender's cached per-user history in step with the table
+    from core.recommend import user_history_cache_key  # recommend imports this module
+    cache.delete(user_history_cache_key(instance.user_id))
 
 
 # ==============================
@@ -393,6 +568,207 @@ class SearchHistory(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
 
+class UserRecommendation(models.Model):
+    """Materialized top-N worker recommendations per user, served by recommend_view."""
+    user = models.OneToOneField(
+        AuthenticatedUser,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='recommendation_cache',
+    )
+    recommendations = models.JSONField(default=list, blank=True)
+    computed_at = models.DateTimeField()
+    is_stale = models.BooleanField(default=False)
+    # Bumped by every invalidation, so a compute can tell one arrived while it ran
+    invalidations = models.PositiveIntegerField(default=0)
+    model_version = models.CharField(max_length=32, blank=True, default='')
+
+    class Meta:
+        db_table = 'user_recommendations'
+        indexes = [
+            models.Index(fields=['computed_at'], name='user_reco_computed_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"Recommendations for {self.user} @ {self.computed_at}"
+
+
+def mark_recommendations_stale(user_id):
+    UserRecommendation.objects.filter(user_id=user_id).update(
+        is_stale=True, invalidations=F('invalidations') + 1,
+    )
+    bump_user_version(user_id)
+
+
+@receiver(post_save, sender=Booking)
+def booking_changed_recommendations(sender, instance, **kwargs):
+    mark_recommendations_stale(instance.user_id)
+    if instance.worker_id:
+        bump_worker_jobs_version(instance.worker_id)
+        # Booking counts are part of the worker's candidate rows, so every
+        # user's ETag depends on them too
+        transaction.on_commit(lambda: record_worker_change(instance.worker_id))
+        transaction.on_commit(bump_workers_version)
+
+
+@receiver(post_save, sender=AuthenticatedUser)
+def user_location_changed_recommendations(sender, instance, created, update_fields=None, **kwargs):
+    # Logins only touch last_login; anything that may move the user invalidates
+    if created or (update_fields is not None and 'location' not in update_fields):
+        return
+    mark_recommendations_stale(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Worker)
+@receiver([post_save, post_delete], sender=WorkerService)
+@receiver([post_save, post_delete], sender=UserReview)
+def worker_data_changed_recommendations(sender, instance, **kwargs):
+    bump_workers_version()
+
+
+def move_worker_rating(worker_id, sum_delta, count_delta):
+    """Shift a worker's running rating totals; average_rating is derived in the same UPDATE."""
+    if not worker_id or not (sum_delta or count_delta):
+        return
+    if recompute_suppressed():
+        note_touched(worker_ids=[worker_id])
+        return
+    rating_sum = F('rating_sum') + sum_delta
+    total_reviews = F('total_reviews') + count_delta
+    Worker.objects.filter(pk=worker_id).update(
+        rating_sum=rating_sum,
+        total_reviews=total_reviews,
+        average_rating=Coalesce(Round(Cast(rating_sum, FloatField()) / NullIf(total_reviews, 0), 2), 0.0),
+    )
+    # update() sends no Worker signals
+    mark_cells_stale(worker_id)
+    transaction.on_commit(lambda: record_worker_change(worker_id))
+
+
+def worker_review_totals():
+    """rating_sum, total_reviews and average_rating recomputed from reviews, as update() expressions."""
+    def total(aggregate, output_field):
+        reviews = (
+            UserReview.objects.filter(worker=OuterRef('pk'), rating__isnull=False)
+            .order_by().values('worker').annotate(value=aggregate).values('value')
+        )
+        return Subquery(reviews, output_field=output_field)
+
+    return {
+        'rating_sum': Coalesce(total(Sum('rating'), IntegerField()), Value(0)),
+        'total_reviews': Coalesce(total(Count('id'), IntegerField()), Value(0)),
+        'average_rating': Coalesce(
+            total(Round(Cast(Sum('rating'), FloatField()) / Count('id'), 2), FloatField()), Value(0.0),
+        ),
+    }
+
+
+@receiver(pre_save, sender=UserReview)
+def remember_review_rating(sender, instance, raw=False, **kwargs):
+    instance._previous_rating = None
+    if instance.pk and not raw and not recompute_suppressed():
+        instance._previous_rating = (
+            UserReview.objects.filter(pk=instance.pk).values_list('worker_id', 'rating').first()
+        )
+
+
+@receiver(post_save, sender=UserReview)
+def review_saved_rating(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if recompute_suppressed():
+        note_touched(worker_ids=[instance.worker_id])
+        return
+    old_worker_id, old_rating = getattr(instance, '_previous_rating', None) or (None, None)
+    if old_worker_id == instance.worker_id:
+        move_worker_rating(
+            instance.worker_id,
+            (instance.rating or 0) - (old_rating or 0),
+            (instance.rating is not None) - (old_rating is not None),
+        )
+        return
+    if old_rating is not None:
+        move_worker_rating(old_worker_id, -old_rating, -1)
+    if instance.rating is not None:
+        move_worker_rating(instance.worker_id, instance.rating, 1)
+
+
+@receiver(post_delete, sender=UserReview)
+def review_deleted_rating(sender, instance, **kwargs):
+    if instance.rating is not None:
+        move_worker_rating(instance.worker_id, -instance.rating, -1)
+
+
+class CellRecommendation(models.Model):
+    """Precomputed new-user candidate rows per grid cell (see core/cold_start.py)."""
+    cell = models.CharField(max_length=40, primary_key=True)
+    # Column name -> list of values, one entry per worker/service row
+    candidates = models.JSONField(default=dict, blank=True)
+    # Distinct candidates['worker_id'], GIN-indexed so a worker's cells are one lookup
+    worker_ids = ArrayField(models.IntegerField(), default=list, blank=True)
+    # Search radius fetch_candidates settles on at the cell centre (null = unbounded)
+    radius_km = models.FloatField(null=True, blank=True)
+    computed_at = models.DateTimeField()
+    is_stale = models.BooleanField(default=False)
+
+    class Meta:
+        db_table = 'cell_recommendations'
+        indexes = [
+            GinIndex(fields=['worker_ids'], name='cell_reco_worker_ids_gin'),
+        ]
+
+    def __str__(self):
+        return f"Cell {self.cell} @ {self.computed_at}"
+
+
+def mark_cells_stale(worker_id, location=None):
+    """Cells listing the worker, plus cells around its location where it may now qualify."""
+    cells = Q(worker_ids__contains=[worker_id])
+    if location is not None:
+        cells |= Q(cell__in=neighbourhood(location.y, location.x, cold_start_options()['stale_ring']))
+    CellRecommendation.objects.filter(cells, is_stale=False).update(is_stale=True)
+
+
+def mark_workers_cells_stale(worker_ids):
+    """mark_cells_stale for many workers at their current locations, in one UPDATE."""
+    worker_ids = list(worker_ids)
+    ring = cold_start_options()['stale_ring']
+    locations = Worker.objects.filter(pk__in=worker_ids, location__isnull=False).values_list('location', flat=True)
+    keys = {key for location in locations for key in neighbourhood(location.y, location.x, ring)}
+    CellRecommendation.objects.filter(
+        Q(worker_ids__overlap=worker_ids) | Q(cell__in=keys), is_stale=False,
+    ).update(is_stale=True)
+
+
+@receiver([post_save, post_delete], sender=Worker)
+@receiver([post_save, post_delete], sender=WorkerService)
+def worker_changed_cell_recommendations(sender, instance, **kwargs):
+    if recompute_suppressed():
+        note_touched(worker_ids=[instance.pk if sender is Worker else instance.worker_id])
+        return
+    if sender is Worker:
+        placement = (instance.location, instance.is_available)
+        if kwargs.get('created') is False and placement == getattr(instance, '_cell_placement', None):
+            # Profile edits, rating/counter saves: no cell gains or loses the worker
+            return
+        instance._cell_placement = placement
+        mark_cells_stale(instance.pk, instance.location)
+    else:
+        location = Worker.objects.filter(pk=instance.worker_id).values_list('location', flat=True).first()
+        mark_cells_stale(instance.worker_id, location)
+
+
+@receiver([post_save, post_delete], sender=Worker)
+@receiver([post_save, post_delete], sender=WorkerService)
+def worker_changed_spatial_index(sender, instance, **kwargs):
+    worker_id = instance.pk if sender is Worker else instance.worker_id
+    if recompute_suppressed():
+        note_touched(worker_ids=[worker_id])
+        return
+    # After commit, so an index replaying the log never reads the old row
+    transaction.on_commit(lambda: record_worker_change(worker_id))
+
+
 # ==============================
 # Session Logs
 # ==============================
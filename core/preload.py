@@ -0,0 +1,179 @@
+# core/preload.py
+import gc
+import json
+import os
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+from django.conf import settings
+
+# Optional preload mode for pre-forking servers (see gunicorn.conf.py): the
+# master loads the ranker and a read-only NumPy worker snapshot once, then
+# freezes the GC so forked workers share those pages copy-on-write instead of
+# each holding a copy. With shared_memory on, the snapshot's numeric columns
+# live in a named segment that non-forked processes can attach to as well.
+# Requests read it through the spatial index (core/spatial_index.py), which each
+# worker builds from the snapshot on first use and then keeps current from the
+# worker change log; the snapshot itself is never modified.
+DEFAULT_PRELOAD_OPTIONS = {
+    "enabled": False,
+    "shared_memory": False,
+    "shared_memory_name": "reco_worker_snapshot",
+}
+
+ALIGN = 64  # byte alignment of each array inside the segment
+
+_snapshot = None
+_shm = None
+
+
+def preload_options():
+    return {**DEFAULT_PRELOAD_OPTIONS, **getattr(settings, 'RECOMMENDER_PRELOAD', {})}
+
+
+def _align(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+
+def _flatten(snapshot):
+    flat = {f"rows.{name}": values for name, values in snapshot['rows'].items()}
+    flat.update((name, values) for name, values in snapshot.items() if name != 'rows')
+    return flat
+
+
+def _unflatten(flat):
+    snapshot = {'rows': {}}
+    for name, values in flat.items():
+        if name.startswith('rows.'):
+            snapshot['rows'][name[len('rows.'):]] = values
+        else:
+            snapshot[name] = values
+    return snapshot
+
+
+def publish_snapshot(snapshot, name):
+    """
+    Copy the snapshot into a new shared-memory segment. Layout: 8-byte header
+    length, JSON header (array dtypes/shapes/offsets plus the object columns), data.
+    """
+    flat = _flatten(snapshot)
+    layout = {'arrays': {}, 'objects': {}}
+    offset = 0
+    for key, values in flat.items():
+        if values.dtype == object:
+            layout['objects'][key] = values.tolist()
+        else:
+            offset = _align(offset)
+            layout['arrays'][key] = [values.dtype.str, list(values.shape), offset]
+            offset += values.nbytes
+    header = json.dumps(layout).encode()
+    data_start = _align(8 + len(header))
+
+    size = max(1, data_start + offset)
+    try:
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+    except FileExistsError:
+        # Left behind by a master that did not shut down cleanly
+        stale = shared_memory.SharedMemory(name=name)
+        stale.close()
+        stale.unlink()
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+    shm.buf[:8] = len(header).to_bytes(8, 'little')
+    shm.buf[8:8 + len(header)] = header
+    for key, (dtype, shape, array_offset) in layout['arrays'].items():
+        target = np.ndarray(tuple(shape), dtype=np.dtype(dtype), buffer=shm.buf, offset=data_start + array_offset)
+        target[:] = flat[key]
+    return shm
+
+
+def read_snapshot(shm):
+    """Read-only snapshot whose numeric columns are views into the segment."""
+    header_len = int.from_bytes(shm.buf[:8], 'little')
+    layout = json.loads(bytes(shm.buf[8:8 + header_len]))
+    data_start = _align(8 + header_len)
+
+    flat = {}
+    for key, (dtype, shape, array_offset) in layout['arrays'].items():
+        values = np.ndarray(tuple(shape), dtype=np.dtype(dtype), buffer=shm.buf, offset=data_start + array_offset)
+        values.flags.writeable = False
+        flat[key] = values
+    for key, values in layout['objects'].items():
+        flat[key] = np.array(values, dtype=object)
+    return _unflatten(flat)
+
+
+def attach_snapshot(name):
+    shm = shared_memory.SharedMemory(name=name)
+    # Only the publishing master may unlink the segment; stop this process's
+    # resource tracker from removing it on exit.
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm, read_snapshot(shm)
+
+
+def _make_read_only(snapshot):
+    for values in _flatten(snapshot).values():
+        values.flags.writeable = False
+    return snapshot
+
+
+def preload(engine=None):
+    """Load the ranker and worker snapshot; call in the master before workers fork."""
+    global _snapshot, _shm
+    from django.db import connections
+
+    from .bulk_recommend import load_worker_snapshot
+    from .db import get_engine
+    from .ml_model import get_model
+
+    options = preload_options()
+    get_model()
+    snapshot = load_worker_snapshot(engine or get_engine())
+    if options['shared_memory']:
+        _shm = publish_snapshot(snapshot, options['shared_memory_name'])
+        _snapshot = read_snapshot(_shm)
+    else:
+        _snapshot = _make_read_only(snapshot)
+
+    # No DB sockets cross the fork (the SQLAlchemy pool resets itself, see core.db)
+    connections.close_all()
+    # Move everything loaded so far out of the collector's reach, so GC passes in
+    # the children do not write to (and thereby copy) the shared pages.
+    gc.collect()
+    gc.freeze()
+    return _snapshot
+
+
+def release():
+    """Drop the shared-memory segment (master shutdown)."""
+    global _shm
+    if _shm is not None:
+        _shm.close()
+        _shm.unlink()
+        _shm = None
+
+
+def worker_snapshot():
+    """The preloaded snapshot, attaching to the shared segment if needed; None when not preloaded."""
+    global _snapshot, _shm
+    if _snapshot is None and preload_options()['shared_memory']:
+        try:
+            _shm, _snapshot = attach_snapshot(preload_options()['shared_memory_name'])
+        except FileNotFoundError:
+            return None
+    return _snapshot
+
+
+def process_memory():
+    """RSS breakdown of this process in KiB (Linux), to check per-worker memory stays flat."""
+    fields = ('VmRSS', 'RssAnon', 'RssFile', 'RssShmem')
+    usage = {'pid': os.getpid()}
+    try:
+        with open('/proc/self/status') as fh:
+            for line in fh:
+                key, _, value = line.partition(':')
+                if key in fields:
+                    usage[key] = int(value.split()[0])
+    except OSError:
+        import resource
+        usage['maxrss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage
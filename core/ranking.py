@@ -0,0 +1,96 @@
+# core/ranking.py
+import numpy as np
+
+# Ranking core for recommendations. Candidates are a dict of equal-length
+# column arrays (one row per worker/service pair); nothing here builds a
+# DataFrame, so a request only pays for a few vectorised passes.
+
+# How a worker's rows collapse into one recommendation
+WORKER_REDUCTIONS = {
+    'worker_name': 'first',
+    'service_name': 'first',
+    'worker_lat': 'first',
+    'worker_lon': 'first',
+    'charge': 'mean',
+    'num_bookings': 'sum',
+    'total_rating': 'mean',
+    'is_available': 'first',
+    'distance_km': 'min',
+    'service_match': 'max',
+    'score': 'max',
+}
+NEW_USER_WORKER_REDUCTIONS = {k: v for k, v in WORKER_REDUCTIONS.items() if k != 'service_match'}
+
+
+def linear_scores(cols):
+    """Hand-tuned heuristic, used as stage one and when the ranker is unavailable."""
+    return (
+        -cols['distance_km']
+        + cols['total_rating'] * 1.0
+        + cols['num_bookings'] * 0.5
+        + cols['service_match'] * 1.0   # bonus if familiar service
+        - cols['charge'] * 0.2
+    )
+
+
+def worker_segments(worker_ids):
+    """Stable sort order by worker id and the start offset of each worker's run."""
+    order = np.argsort(worker_ids, kind='stable')
+    sorted_ids = worker_ids[order]
+    starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+    return order, starts
+
+
+def reduce_by_worker(cols, reductions=WORKER_REDUCTIONS):
+    """One row per worker, combining duplicate rows with ufunc.reduceat over sorted ids."""
+    order, starts = worker_segments(cols['worker_id'])
+    counts = np.diff(np.r_[starts, len(order)])
+    reduced = {'worker_id': cols['worker_id'][order[starts]]}
+    for name, how in reductions.items():
+        values = cols[name][order]
+        if how == 'first':
+            reduced[name] = values[starts]
+        elif how == 'max':
+            reduced[name] = np.maximum.reduceat(values, starts)
+        elif how == 'min':
+            reduced[name] = np.minimum.reduceat(values, starts)
+        elif how == 'sum':
+            reduced[name] = np.add.reduceat(values, starts)
+        elif how == 'mean':
+            reduced[name] = np.add.reduceat(values.astype(np.float64), starts) / counts
+        else:
+            raise ValueError(f"Unknown reduction {how!r} for {name}")
+    return reduced
+
+
+def top_k_indices(scores, k):
+    """Indices of the k highest scores, best first, via argpartition."""
+    if len(scores) > k:
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(len(scores))
+    return idx[np.argsort(-scores[idx], kind='stable')]
+
+
+def top_workers_mask(worker_ids, scores, k):
+    """Row mask keeping every row of the k workers whose best row scores highest."""
+    order, starts = worker_segments(worker_ids)
+    if len(starts) <= k:
+        return np.ones(len(scores), dtype=bool)
+    best = np.maximum.reduceat(scores[order], starts)
+    keep_worker = np.zeros(len(starts), dtype=bool)
+    keep_worker[top_k_indices(best, k)] = True
+    counts = np.diff(np.r_[starts, len(order)])
+    mask = np.empty(len(scores), dtype=bool)
+    mask[order] = np.repeat(keep_worker, counts)
+    return mask
+
+
+def take(cols, index):
+    return {name: values[index] for name, values in cols.items()}
+
+
+def to_records(cols, index, names):
+    """Plain-Python dicts (JSON serialisable) for the rows at ``index``."""
+    columns = [cols[name][index].tolist() for name in names]
+    return [dict(zip(names, row)) for row in zip(*columns)]
@@ -0,0 +1,452 @@
+# core/recommend.py
+import logging
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .data_prep import build_feature_matrix
+from .geogrid import cold_start_options
+from .inference import predict
+from .models import AuthenticatedUser, UserRecommendation
+from .ranking import (
+    NEW_USER_WORKER_REDUCTIONS, WORKER_REDUCTIONS, linear_scores, reduce_by_worker, take,
+    to_records, top_k_indices, top_workers_mask,
+)
+from .singleflight import single_flight
+from .utils import haversine_vector
+
+logger = logging.getLogger(__name__)
+
+USER_HISTORY_CACHE_TTL = 3600
+
+# Candidate retrieval: nearest available workers via the GiST index on workers.location.
+# Radii are tried in order until enough workers are found; None means "no radius bound".
+DEFAULT_CANDIDATE_OPTIONS = {
+    "radii_km": [5, 15, 50, 200, None],
+    "min_workers": 50,
+    "max_workers": 300,
+}
+
+CANDIDATE_SQL = """
+    WITH nearest AS (
+        SELECT w.id, w.user_id, w.location, w.average_rating, w.is_available,
+               w.completed_bookings, w.total_bookings
+        FROM workers w
+        WHERE w.is_available = TRUE AND w.location IS NOT NULL
+          {radius_filter}
+        ORDER BY w.location <-> ST_SetSRID(ST_MakePoint(%(lon)s, %(lat)s), 4326)::geography
+        LIMIT %(max_workers)s
+    )
+    SELECT n.id AS worker_id,
+           wu.name AS worker_name,
+           s.id AS service_id,
+           s.service_type AS service_name,
+           ST_Y(n.location::geometry) AS worker_lat,
+           ST_X(n.location::geometry) AS worker_lon,
+           n.completed_bookings AS num_bookings,
+           n.total_bookings AS booking_count,
+           n.average_rating AS total_rating,
+           ws.charge,
+           n.is_available,
+           COALESCE(s.id = ANY(%(past_services)s), FALSE)::int AS service_match
+    FROM nearest n
+    LEFT JOIN worker_services ws ON n.id = ws.worker_id
+    LEFT JOIN core_service s ON ws.service_id = s.id
+    LEFT JOIN core_authenticateduser wu ON n.user_id = wu.id
+    {service_filter}
+"""
+
+RADIUS_FILTER = (
+    "AND ST_DWithin(w.location, "
+    "ST_SetSRID(ST_MakePoint(%(lon)s, %(lat)s), 4326)::geography, %(radius_m)s)"
+)
+
+
+def candidate_options():
+    return {**DEFAULT_CANDIDATE_OPTIONS, **getattr(settings, 'RECOMMENDER_CANDIDATES', {})}
+
+
+def fetch_candidates(engine, user_point, past_services=None, require_service=False):
+    """
+    Rows (one per worker/service) for the nearest available workers to user_point.
+    Starts with a small ST_DWithin radius and widens it until at least
+    min_workers distinct workers are found, so only the few hundred nearest
+    workers are ever read. With RECOMMENDER_SPATIAL_INDEX enabled the same rows
+    come from the process's in-memory worker index instead.
+    """
+    from .spatial_index import get_worker_index, spatial_index_options
+
+    if spatial_index_options()['enabled']:
+        return get_worker_index(engine).candidates(user_point, past_services, require_service)
+
+    options = candidate_options()
+    sql_params = {
+        "lat": user_point.y,
+        "lon": user_point.x,
+        "max_workers": options["max_workers"],
+        "past_services": list(past_services or []),
+    }
+    service_filter = "WHERE s.id IS NOT NULL" if require_service else ""
+
+    cols = None
+    with engine.connect() as conn:
+        for radius_km in options["radii_km"]:
+            if radius_km is None:
+                radius_filter = ""
+            else:
+                radius_filter = RADIUS_FILTER
+                sql_params["radius_m"] = radius_km * 1000.0
+            sql = CANDIDATE_SQL.format(radius_filter=radius_filter, service_filter=service_filter)
+            result = conn.exec_driver_sql(sql, sql_params)
+            cols = rows_to_columns(result.keys(), result.fetchall())
+            if len(np.unique(cols["worker_id"])) >= options["min_workers"]:
+                break
+    return cols
+
+
+# Column dtypes for candidate rows; anything not listed stays an object array.
+# Nullable numeric columns come back as NaN and are filled before ranking.
+CANDIDATE_DTYPES = {
+    "worker_id": np.int64,
+    "worker_lat": np.float64,
+    "worker_lon": np.float64,
+    "num_bookings": np.int64,
+    "booking_count": np.int64,
+    "total_rating": np.float64,
+    "charge": np.float64,
+    "is_available": np.bool_,
+    "service_match": np.int64,
+}
+
+
+def rows_to_columns(keys, rows):
+    columns = list(zip(*rows)) if rows else [()] * len(keys)
+    return {
+        key: np.array(values, dtype=CANDIDATE_DTYPES.get(key, object))
+        for key, values in zip(keys, columns)
+    }
+
+
+def user_history_cache_key(user_id):
+    return f"reco:user_history:{user_id}"
+
+
+def get_user_history(user_id, engine):
+    """
+    Past service ids and average rating over the user's user_worker_data rows,
+    from cache or one keyed query.
+    """
+    key = user_history_cache_key(user_id)
+    history = cache.get(key)
+    if history is None:
+        with engine.connect() as conn:
+            row = conn.exec_driver_sql("""
+                SELECT COALESCE(array_agg(DISTINCT service_id), '{}') AS past_services,
+                       AVG(COALESCE(total_rating, 0)) AS avg_rating
+                FROM user_worker_data
+                WHERE user_id = %(user_id)s
+            """, {"user_id": user_id}).first()
+        history = {
+            "past_services": sorted(row.past_services),
+            "avg_rating": None if row.avg_rating is None else float(row.avg_rating),
+        }
+        cache.set(key, history, USER_HISTORY_CACHE_TTL)
+    return history
+
+
+def get_user_context(user_id, engine):
+    """Location and booking history flag for a single user, or None without a location."""
+    with engine.connect() as conn:
+        row = conn.exec_driver_sql("""
+            SELECT ST_Y(u.location::geometry) AS lat,
+                   ST_X(u.location::geometry) AS lon,
+                   EXISTS (SELECT 1 FROM bookings b WHERE b.user_id = u.id) AS has_bookings
+            FROM core_authenticateduser u
+            WHERE u.id = %(user_id)s AND u.location IS NOT NULL
+        """, {"user_id": user_id}).first()
+    if row is None:
+        return None
+    from shapely.geometry import Point
+    return {"point": Point(row.lon, row.lat), "has_bookings": bool(row.has_bookings)}
+
+
+def build_user_locs_dict(engine):
+    import pandas as pd
+    from shapely.geometry import Point
+
+    user_locs = pd.read_sql("""
+        SELECT id,
+               ST_Y(location::geometry) AS lat,
+               ST_X(location::geometry) AS lon
+        FROM core_authenticateduser
+        WHERE location IS NOT NULL;
+    """, engine)
+    return {row["id"]: Point(row["lon"], row["lat"]) for _, row in user_locs.iterrows()}
+
+def user_has_single_worker_repeated(user_id, engine, threshold=3):
+    import pandas as pd
+
+    query = """
+        SELECT worker_id
+        FROM bookings
+        WHERE user_id = %s
+        ORDER BY id DESC
+        LIMIT %s;
+    """
+    bookings = pd.read_sql(query, engine, params=(user_id, threshold))
+    return bookings['worker_id'].nunique() == 1 if not bookings.empty else False
+
+
+# Stage one keeps the prefilter_k best workers by heuristic; stage two (ranker)
+# only runs if it is expected to finish within budget_ms of the request start.
+DEFAULT_CASCADE_OPTIONS = {
+    "prefilter_k": 100,
+    "budget_ms": 150,
+}
+
+
+def scoring_mode():
+    return getattr(settings, 'RECOMMENDER_SCORING', 'model')
+
+
+def cascade_options():
+    return {**DEFAULT_CASCADE_OPTIONS, **getattr(settings, 'RECOMMENDER_CASCADE', {})}
+
+
+class StageTimer:
+    """Wall-clock timings per ranking stage, checked against an optional latency budget."""
+
+    def __init__(self, budget_ms=None):
+        self.start = time.perf_counter()
+        self.budget_ms = budget_ms
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = (time.perf_counter() - started) * 1000.0
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.start) * 1000.0
+
+    def can_afford(self, estimate_ms):
+        return self.budget_ms is None or self.elapsed_ms() + estimate_ms <= self.budget_ms
+
+    def server_timing(self):
+        """Value for the Server-Timing response header."""
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in self.timings.items())
+
+
+# Moving average of stage-two cost, used to decide whether it still fits the budget
+_stage_two_estimate_ms = 0.0
+
+
+def model_scores(cols, user_point, model, user_avg_rating=None):
+    """Ranker scores for every candidate row in one predict call, None if it fails."""
+    X = build_feature_matrix(cols, user_point.y, user_point.x, user_avg_rating)
+    try:
+        return predict(model, X)
+    except Exception:
+        logger.exception("Ranker prediction failed, falling back to linear scoring")
+        return None
+
+
+def rank_candidates(cols, user_point, model, top_n, user_avg_rating=None,
+                    reductions=WORKER_REDUCTIONS, timer=None):
+    """
+    Two-stage cascade over candidate column arrays: the linear heuristic keeps
+    the best prefilter_k workers, then the ranker (RECOMMENDER_SCORING = 'model')
+    reranks only those. When the latency budget cannot fit stage two, the
+    stage-one ranking is returned.
+    """
+    global _stage_two_estimate_ms
+    timer = timer or StageTimer()
+    options = cascade_options()
+
+    with timer.stage('stage1'):
+        # LEFT JOINs leave NULL charge/rating on some rows
+        cols["total_rating"] = np.nan_to_num(cols["total_rating"])
+        cols["charge"] = np.nan_to_num(cols["charge"])
+
+        # Distance from user
+        cols['distance_km'] = haversine_vector(
+            user_point.y, user_point.x,
+            cols['worker_lat'], cols['worker_lon']
+        )
+
+        heuristic = linear_scores(cols)
+        keep = top_workers_mask(cols['worker_id'], heuristic, options['prefilter_k'])
+        cols = take(cols, keep)
+        cols['score'] = heuristic[keep]
+
+    if model is not None and scoring_mode() == 'model':
+        if timer.can_afford(_stage_two_estimate_ms):
+            with timer.stage('stage2'):
+                scores = model_scores(cols, user_point, model, user_avg_rating)
+            if scores is not None:
+                cols['score'] = np.asarray(scores, dtype=np.float64)
+            _stage_two_estimate_ms = 0.8 * _stage_two_estimate_ms + 0.2 * timer.timings['stage2']
+        else:
+            logger.info("Latency budget exhausted after %.1f ms, serving stage-one ranking", timer.elapsed_ms())
+            timer.timings['stage2_skipped'] = 0.0
+
+    # Collapse to one row per worker and return the top N
+    workers = reduce_by_worker(cols, reductions)
+    best = top_k_indices(workers['score'], top_n)
+    return to_records(workers, best, ['worker_id', *reductions])
+
+
+def recommend_top_n_for_user(user_id, model, engine, top_n=5, timer=None):
+    """
+    Recommend top N workers for a user:
+    - New user: location, rating, bookings, charge
+    - Existing user: combination of
+        1. Workers offering past services (familiar)
+        2. Nearby high-rated workers not offering past services (exploration)
+    Candidates are scored by the LightGBM ranker (RECOMMENDER_SCORING = 'model')
+    or the linear heuristic ('linear'); per-stage timings land on ``timer``.
+    """
+    timer = timer or StageTimer()
+    with timer.stage('user'):
+        user_ctx = get_user_context(user_id, engine)
+    if not user_ctx:
+        return []
+    user_point = user_ctx["point"]
+
+    if not user_ctx["has_bookings"]:
+        return recommend_top_n_for_user_new(user_id, engine, user_point, top_n, model=model, timer=timer)
+
+    # Existing user
+    with timer.stage('history'):
+        history = get_user_history(user_id, engine)
+    past_services = history["past_services"]
+    if not past_services:
+        return recommend_top_n_for_user_new(user_id, engine, user_point, top_n, model=model, timer=timer)
+
+    # Nearest workers offering any service; service_match flags past services
+    # (familiar) vs. everything else (exploration)
+    with timer.stage('candidates'):
+        cand_cols = fetch_candidates(engine, user_point, past_services, require_service=True)
+    if not len(cand_cols['worker_id']):
+        return recommend_top_n_for_user_new(user_id, engine, user_point, top_n, model=model, timer=timer)
+
+    return rank_candidates(cand_cols, user_point, model, top_n,
+                           user_avg_rating=history["avg_rating"], timer=timer)
+
+
+def recommend_top_n_for_user_new(user_id, engine, user_point, top_n=5, model=None, timer=None, use_cells=True):
+    """
+    Fallback / new user recommendations. Candidates come from the precomputed
+    grid cells around the user when available (see core/cold_start.py), else
+    from the nearest-worker query.
+    """
+    timer = timer or StageTimer()
+    with timer.stage('candidates'):
+        cand_cols = None
+        if use_cells and cold_start_options()['enabled']:
+            from .cold_start import cell_candidates  # cold_start builds on this module
+            cand_cols = cell_candidates(user_point.y, user_point.x)
+        if cand_cols is None:
+            cand_cols = fetch_candidates(engine, user_point)
+
+    if not len(cand_cols['worker_id']):
+        return []
+
+    return rank_candidates(cand_cols, user_point, model, top_n,
+                           reductions=NEW_USER_WORKER_REDUCTIONS, timer=timer)
+
+
+# Materialized recommendations (user_recommendations table): served while younger
+# than max_age_seconds and not flagged stale by a booking or location change.
+DEFAULT_MATERIALIZED_OPTIONS = {
+    "max_age_seconds": 300,
+    "active_within_hours": 24,
+}
+
+
+def materialized_options():
+    return {**DEFAULT_MATERIALIZED_OPTIONS, **getattr(settings, 'RECOMMENDER_MATERIALIZED', {})}
+
+
+def get_materialized_recommendations(user_id, max_age_seconds=None, model_version=None):
+    """
+    Stored recommendations, computed_at and model_version for the user if still
+    fresh (and, when given, produced by model_version), else None.
+    """
+    if max_age_seconds is None:
+        max_age_seconds = materialized_options()['max_age_seconds']
+    cutoff = timezone.now() - timedelta(seconds=max_age_seconds)
+    entries = UserRecommendation.objects.filter(user_id=user_id, is_stale=False, computed_at__gte=cutoff)
+    if model_version is not None:
+        entries = entries.filter(model_version=model_version)
+    return entries.values('recommendations', 'computed_at', 'model_version').first()
+
+
+def materialize_recommendations(user_id, model, engine, top_n=5, timer=None):
+    """Recompute the user's top-N and store it; returns (recommendations, computed_at)."""
+    computed_at = timezone.now()
+    entries = UserRecommendation.objects.filter(user_id=user_id)
+    seen = entries.values_list('invalidations', flat=True).first()
+    recommendations = recommend_top_n_for_user(user_id, model, engine, top_n=top_n, timer=timer) or []
+    fields = {
+        'recommendations': recommendations,
+        'computed_at': computed_at,
+        'model_version': getattr(model, 'version', ''),
+    }
+    # Only clear is_stale if nothing invalidated the entry while we computed
+    if seen is None or not entries.filter(invalidations=seen).update(is_stale=False, **fields):
+        UserRecommendation.objects.update_or_create(
+            user_id=user_id, defaults=fields, create_defaults={**fields, 'is_stale': False},
+        )
+    return recommendations, computed_at
+
+
+def materialize_recommendations_once(user_id, model, engine, top_n=5, timer=None):
+    """
+    materialize_recommendations, with concurrent calls for the same user and
+    parameters (duplicate tabs, client retries) sharing one computation.
+    """
+    key = f"reco:compute:{user_id}:{top_n}:{getattr(model, 'version', '')}"
+    return single_flight(
+        key, lambda: materialize_recommendations(user_id, model, engine, top_n=top_n, timer=timer)
+    )
+
+
+def users_needing_refresh(max_age_seconds=None, active_within_hours=None, model_version=None):
+    """
+    Ids of users whose stored recommendations should be recomputed: anything
+    flagged stale, plus recently active users whose entry is old, missing or
+    (when model_version is given) produced by another model version.
+    """
+    options = materialized_options()
+    if max_age_seconds is None:
+        max_age_seconds = options['max_age_seconds']
+    if active_within_hours is None:
+        active_within_hours = options['active_within_hours']
+    now = timezone.now()
+    old_cutoff = now - timedelta(seconds=max_age_seconds)
+    active_cutoff = now - timedelta(hours=active_within_hours)
+
+    expired = Q(computed_at__lt=old_cutoff)
+    if model_version is not None:
+        expired |= ~Q(model_version=model_version)
+    outdated = UserRecommendation.objects.filter(
+        Q(is_stale=True) | (expired & Q(user__last_login__gte=active_cutoff))
+    ).values_list('user_id', flat=True)
+    missing = AuthenticatedUser.objects.filter(
+        last_login__gte=active_cutoff,
+        location__isnull=False,
+        recommendation_cache__isnull=True,
+    ).values_list('id', flat=True)
+    return sorted(set(outdated) | set(missing))
+
@@ -0,0 +1,104 @@
+# core/singleflight.py
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Single-flight: concurrent calls with the same key run the work once and
+# share the result. In-process coalescing is always on; with cross_process
+# the leader also takes a lock in the cache backend (needs a shared backend
+# such as Redis/Memcached) and publishes its result there for other processes.
+DEFAULT_SINGLE_FLIGHT_OPTIONS = {
+    "cross_process": False,
+    "lock_timeout": 10,     # seconds before a crashed leader's lock expires
+    "wait_timeout": 5.0,    # followers give up waiting and compute themselves
+    "poll_interval": 0.05,
+    "result_ttl": 5,        # seconds the shared result stays readable
+}
+
+
+def single_flight_options():
+    return {**DEFAULT_SINGLE_FLIGHT_OPTIONS, **getattr(settings, 'RECOMMENDER_SINGLE_FLIGHT', {})}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Run fn() once per key among concurrent callers in this process."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+_group = SingleFlight()
+
+_MISSING = object()
+
+
+def _cross_process(key, fn, options):
+    lock_key = f"singleflight:lock:{key}"
+    result_key = f"singleflight:result:{key}"
+    token = uuid.uuid4().hex
+
+    if cache.add(lock_key, token, timeout=options['lock_timeout']):
+        try:
+            result = fn()
+            cache.set(result_key, result, timeout=options['result_ttl'])
+            return result
+        finally:
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+
+    # Another process is computing: wait for its result, or for the lock to go away
+    deadline = time.monotonic() + options['wait_timeout']
+    while time.monotonic() < deadline:
+        result = cache.get(result_key, _MISSING)
+        if result is not _MISSING:
+            return result
+        if cache.get(lock_key) is None:
+            break
+        time.sleep(options['poll_interval'])
+    result = cache.get(result_key, _MISSING)
+    return fn() if result is _MISSING else result
+
+
+def single_flight(key, fn):
+    """
+    fn() computed once for concurrent callers sharing ``key``; duplicates wait
+    for and return the leader's result (or its exception, in-process).
+    """
+    options = single_flight_options()
+    if options['cross_process']:
+        return _group.do(key, lambda: _cross_process(key, fn, options))
+    return _group.do(key, fn)
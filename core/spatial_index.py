@@ -0,0 +1,245 @@
+# core/spatial_index.py
+import math
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .bulk_recommend import candidate_radius, load_worker_snapshot
+from .catalog import WorkerCatalog
+from .preload import worker_snapshot
+from .recommend import candidate_options, rows_to_columns
+from .utils import haversine_vector
+from .versions import worker_changes_between, worker_changes_seq
+
+# In-memory uniform-grid index over available workers, one row per
+# worker/service pair (the same columns the candidate SQL returns). Built once
+# per process, then kept current by replaying the worker change log that the
+# Worker/WorkerService/Booking receivers append to (core/versions.py), so
+# candidate lookups never touch the database. With RECOMMENDER_PRELOAD the index
+# starts from the master's snapshot and replays what changed since it was taken.
+DEFAULT_SPATIAL_INDEX_OPTIONS = {
+    "enabled": False,
+    "cell_size_deg": 0.1,
+    "sync_interval": 1.0,   # seconds between change-log checks
+    "max_replay": 1000,     # more pending changes than this triggers a rebuild
+}
+
+KM_PER_DEGREE = 111.195
+
+WORKER_ROWS_SQL = """
+    SELECT w.id AS worker_id,
+           wu.name AS worker_name,
+           s.id AS service_id,
+           s.service_type AS service_name,
+           ST_Y(w.location::geometry) AS worker_lat,
+           ST_X(w.location::geometry) AS worker_lon,
+           w.completed_bookings AS num_bookings,
+           w.total_bookings AS booking_count,
+           w.average_rating AS total_rating,
+           ws.charge,
+           w.is_available,
+           0 AS service_match
+    FROM workers w
+    LEFT JOIN worker_services ws ON w.id = ws.worker_id
+    LEFT JOIN core_service s ON ws.service_id = s.id
+    LEFT JOIN core_authenticateduser wu ON w.user_id = wu.id
+    WHERE w.id = ANY(%(worker_ids)s) AND w.is_available = TRUE AND w.location IS NOT NULL
+"""
+
+
+def spatial_index_options():
+    return {**DEFAULT_SPATIAL_INDEX_OPTIONS, **getattr(settings, 'RECOMMENDER_SPATIAL_INDEX', {})}
+
+
+class WorkerIndex:
+    def __init__(self, columns, cell_size_deg):
+        self.columns = list(columns)
+        self.cell_size = cell_size_deg
+        self.rows = {}     # worker_id -> list of row tuples
+        self.coords = {}   # worker_id -> (lat, lon)
+        self.cells = {}    # (i, j) -> set of worker_ids
+        self.seq = 0       # last change-log entry applied
+        self.lock = threading.RLock()
+
+    @classmethod
+    def from_snapshot(cls, snapshot, cell_size_deg):
+        cols = WorkerCatalog(snapshot).rows(slice(None))
+        index = cls(cols.keys(), cell_size_deg)
+        columns = [values.tolist() for values in cols.values()]
+        all_rows = list(zip(*columns))
+        for start, count in zip(snapshot['starts'].tolist(), snapshot['counts'].tolist()):
+            index._insert(all_rows[start:start + count])
+        return index
+
+    def __len__(self):
+        return len(self.coords)
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell_size), math.floor(lon / self.cell_size)
+
+    def _insert(self, rows):
+        worker_id = rows[0][self.columns.index('worker_id')]
+        lat = rows[0][self.columns.index('worker_lat')]
+        lon = rows[0][self.columns.index('worker_lon')]
+        self.rows[worker_id] = rows
+        self.coords[worker_id] = (lat, lon)
+        self.cells.setdefault(self._cell(lat, lon), set()).add(worker_id)
+
+    def _remove(self, worker_id):
+        coords = self.coords.pop(worker_id, None)
+        self.rows.pop(worker_id, None)
+        if coords is not None:
+            cell = self._cell(*coords)
+            members = self.cells.get(cell)
+            if members is not None:
+                members.discard(worker_id)
+                if not members:
+                    del self.cells[cell]
+
+    def reload(self, engine, worker_ids):
+        """Re-read the given workers; unavailable or deleted ones drop out."""
+        worker_ids = list(worker_ids)
+        with engine.connect() as conn:
+            result = conn.exec_driver_sql(WORKER_ROWS_SQL, {'worker_ids': worker_ids})
+            keys = list(result.keys())
+            positions = [keys.index(name) for name in self.columns]
+            by_worker = {}
+            for row in result:
+                by_worker.setdefault(row[keys.index('worker_id')], []).append(tuple(row[p] for p in positions))
+        with self.lock:
+            for worker_id in worker_ids:
+                self._remove(worker_id)
+            for rows in by_worker.values():
+                self._insert(rows)
+
+    def _ring(self, i0, j0, ring):
+        if ring == 0:
+            yield (i0, j0)
+            return
+        for dj in range(-ring, ring + 1):
+            yield (i0 - ring, j0 + dj)
+            yield (i0 + ring, j0 + dj)
+        for di in range(-ring + 1, ring):
+            yield (i0 + di, j0 - ring)
+            yield (i0 + di, j0 + ring)
+
+    def _max_ring(self, i0, j0):
+        # Beyond this ring there are no occupied cells at all
+        if not self.cells:
+            return -1
+        return max(max(abs(i - i0), abs(j - j0)) for i, j in self.cells)
+
+    def _ring_min_km(self, lat, ring):
+        # Nothing in ring+1 or beyond is closer than ``ring`` whole cells
+        widest_lat = min(90.0, abs(lat) + (ring + 1) * self.cell_size)
+        return ring * self.cell_size * KM_PER_DEGREE * math.cos(math.radians(widest_lat))
+
+    def _search(self, lat, lon, done):
+        """Expand rings until done(distances, ring) or the grid is exhausted; nearest first."""
+        i0, j0 = self._cell(lat, lon)
+        last_ring = self._max_ring(i0, j0)
+        ids = np.array([], dtype=np.int64)
+        distances = np.array([], dtype=np.float64)
+        ring = 0
+        while ring <= last_ring:
+            ring_ids = [w for cell in self._ring(i0, j0, ring) for w in self.cells.get(cell, ())]
+            if ring_ids:
+                coords = np.array([self.coords[w] for w in ring_ids])
+                ids = np.concatenate([ids, np.array(ring_ids, dtype=np.int64)])
+                distances = np.concatenate([distances, haversine_vector(lat, lon, coords[:, 0], coords[:, 1])])
+            if done(distances, ring):
+                break
+            ring += 1
+        order = np.argsort(distances, kind='stable')
+        return ids[order], distances[order]
+
+    def nearest(self, lat, lon, k):
+        """Ids and distances (km) of the k nearest workers, nearest first."""
+        def done(distances, ring):
+            if len(distances) < k:
+                return False
+            return np.partition(distances, k - 1)[k - 1] <= self._ring_min_km(lat, ring)
+
+        with self.lock:
+            ids, distances = self._search(lat, lon, done)
+        return ids[:k], distances[:k]
+
+    def within(self, lat, lon, radius_km):
+        """Ids and distances (km) of every worker within radius_km, nearest first."""
+        with self.lock:
+            ids, distances = self._search(lat, lon, lambda _, ring: self._ring_min_km(lat, ring) >= radius_km)
+        keep = distances <= radius_km
+        return ids[keep], distances[keep]
+
+    def candidates(self, user_point, past_services=None, require_service=False):
+        """Same rows recommend.fetch_candidates would return, from memory."""
+        options = candidate_options()
+        service_col = self.columns.index('service_id')
+        with self.lock:
+            ids, distances = self.nearest(user_point.y, user_point.x, options['max_workers'])
+            counted = distances
+            if require_service:
+                # The SQL counts workers after dropping rows without a service
+                offers = [any(row[service_col] is not None for row in self.rows[w]) for w in ids.tolist()]
+                counted = distances[np.array(offers, dtype=bool)]
+            radius_km = candidate_radius(counted, options)
+            if radius_km is not None:
+                ids = ids[distances <= radius_km]
+            rows = [row for worker_id in ids.tolist() for row in self.rows[worker_id]]
+        cols = rows_to_columns(self.columns, rows)
+        if len(rows):
+            cols['service_match'] = np.isin(cols['service_id'], list(past_services or [])).astype(np.int64)
+            if require_service:
+                has_service = cols['service_id'] != None  # noqa: E711 (object array)
+                cols = {name: values[has_service] for name, values in cols.items()}
+        return cols
+
+
+_index = None
+_last_sync = 0.0
+_index_lock = threading.Lock()
+
+
+def build_worker_index(engine, snapshot=None):
+    """Index over snapshot (a fresh one by default), current as of the snapshot's change-log position."""
+    if snapshot is None:
+        snapshot = load_worker_snapshot(engine)
+    index = WorkerIndex.from_snapshot(snapshot, spatial_index_options()['cell_size_deg'])
+    index.seq = int(snapshot['seq'][0])
+    return index
+
+
+def sync_worker_index(index, engine):
+    """Apply pending change-log entries; returns the index to use (rebuilt if the log has a gap)."""
+    options = spatial_index_options()
+    seq = worker_changes_seq()
+    if seq == index.seq:
+        return index
+    changed = None
+    if index.seq < seq <= index.seq + options['max_replay']:
+        changed = worker_changes_between(index.seq, seq)
+    if changed is None:
+        return build_worker_index(engine)
+    index.reload(engine, changed)
+    index.seq = seq
+    return index
+
+
+def get_worker_index(engine):
+    """This process's worker index, built on first use and synced every sync_interval seconds."""
+    global _index, _last_sync
+    now = time.monotonic()
+    if _index is not None and now - _last_sync < spatial_index_options()['sync_interval']:
+        return _index
+    with _index_lock:
+        if _index is None:
+            snapshot = worker_snapshot()
+            _index = build_worker_index(engine, snapshot)
+            if snapshot is not None:
+                _index = sync_worker_index(_index, engine)
+        elif now - _last_sync >= spatial_index_options()['sync_interval']:
+            _index = sync_worker_index(_index, engine)
+        _last_sync = now
+    return _index
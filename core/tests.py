@@ -1,3 +1,450 @@
-from django.test import TestCase
+import gc
+import importlib
+import os
+import subprocess
+import sys
+from contextlib import contextmanager
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core import preload as preloading
+from core.bulk_recommend import load_worker_snapshot, recommend_chunk, rows_for_workers
+from core.catalog import WorkerCatalog
+from core.data_prep import FEATURE_COLS, add_training_features, build_feature_matrix
+from core.models import AuthenticatedUser, Booking, Service, UserReview, Worker
+from core.recommend import fetch_candidates, rows_to_columns
+from core import worker_data
+from core import spatial_index
+from core.spatial_index import WORKER_ROWS_SQL, build_worker_index, get_worker_index
+from core.versions import record_worker_change, shared_cache
+from core.worker_data import WorkerDataQueue, flush_worker_data
+
+
+# Columns of fetch_candidates / SNAPSHOT_SQL rows, one row per worker/service pair
+CANDIDATE_KEYS = (
+    "worker_id", "worker_name", "service_id", "service_name", "worker_lat", "worker_lon",
+    "num_bookings", "booking_count", "total_rating", "charge", "is_available", "service_match",
+)
+
+
+class FeatureParityTests(SimpleTestCase):
+    """Serving features must be exactly what train_model fed the ranker."""
+
+    def make_workers(self):
+        rng = np.random.default_rng(7)
+        n = 40
+        # Each worker's latest booking: its user, service and charge
+        return pd.DataFrame({
+            "worker_id": np.arange(100, 100 + n),
+            "user_id": rng.integers(1, 4, n),
+            "service_id": rng.integers(1, 6, n),
+            "worker_lat": rng.uniform(12.9, 13.0, n),
+            "worker_lon": rng.uniform(75.2, 75.4, n),
+            "charge": rng.integers(100, 1000, n),
+            "completed_bookings": rng.integers(0, 10, n),
+            "total_bookings": rng.integers(10, 20, n),
+            "average_rating": rng.uniform(1, 5, n),
+        })
+
+    def user_worker_data(self, workers):
+        # What UserWorkerData holds per worker (see core/worker_data.py)
+        return pd.DataFrame({
+            "user_id": workers["user_id"],
+            "worker_id": workers["worker_id"],
+            "service_id": workers["service_id"],
+            "worker_lat": workers["worker_lat"],
+            "worker_lon": workers["worker_lon"],
+            "charge": workers["charge"],
+            "num_bookings": workers["total_bookings"],
+            "total_rating": workers["average_rating"],
+        })
+
+    def candidate_row(self, worker, service_id, charge, past_services):
+        # Shaped like a CANDIDATE_SQL row for this worker/service pair
+        return (
+            worker.worker_id, f"worker {worker.worker_id}", service_id, f"service {service_id}",
+            worker.worker_lat, worker.worker_lon, worker.completed_bookings, worker.total_bookings,
+            worker.average_rating, float(charge), True, int(service_id in past_services),
+        )
+
+    def test_serving_matrix_matches_training_features(self):
+        user_lat, user_lon = 12.95, 75.3
+        workers = self.make_workers()
+        df = self.user_worker_data(workers)
+        df["lat_user"] = user_lat
+        df["lon_user"] = user_lon
+        train = add_training_features(df)
+
+        user_rows = train[train["user_id"] == 1].reset_index(drop=True)
+        past_services = set(user_rows["service_id"])
+        user_workers = workers.set_index("worker_id").loc[user_rows["worker_id"]].reset_index()
+        rows = [
+            self.candidate_row(worker, worker.service_id, worker.charge, past_services)
+            for worker in user_workers.itertuples()
+        ]
+        # The first worker also offers a service the user never booked
+        first = next(user_workers.itertuples())
+        rows.append(self.candidate_row(first, 99, 123, past_services))
+        cand = rows_to_columns(CANDIDATE_KEYS, rows)
+        user_avg_rating = df.loc[df["user_id"] == 1, "total_rating"].mean()
+
+        X = build_feature_matrix(cand, user_lat, user_lon, user_avg_rating)
+
+        self.assertEqual(X.dtype, np.float32)
+        self.assertTrue(X.flags["C_CONTIGUOUS"])
+        self.assertEqual(X.shape, (len(user_rows) + 1, len(FEATURE_COLS)))
+        expected = user_rows[FEATURE_COLS].to_numpy(dtype=np.float32)
+        np.testing.assert_allclose(X[:-1], expected, rtol=1e-6)
+
+        # Same worker features for the unbooked service, its own charge and no match
+        unmatched = dict(zip(FEATURE_COLS, X[-1]))
+        self.assertEqual(unmatched["service_match"], 0)
+        self.assertEqual(unmatched["charge"], 123)
+        same_worker = dict(zip(FEATURE_COLS, expected[0]))
+        for col in set(FEATURE_COLS) - {"service_match", "charge"}:
+            self.assertEqual(unmatched[col], same_worker[col], col)
+
+    def test_distance_buckets_follow_training_cut(self):
+        df = pd.DataFrame({
+            "user_id": [1] * 6,
+            "worker_id": range(6),
+            "service_id": [1] * 6,
+            "worker_lat": [12.95] * 6,
+            "worker_lon": [75.3] * 6,
+            "charge": [0] * 6,
+            "num_bookings": [0] * 6,
+            "total_rating": [0.0] * 6,
+            "lat_user": [12.95] * 6,
+            "lon_user": [75.3, 75.305, 75.31, 75.35, 75.45, 76.0],
+        })
+        train = add_training_features(df)
+        expected = pd.cut(train["distance_km"], bins=[-1, 1, 3, 10, 100], labels=[0, 1, 2, 3]).astype(int)
+        self.assertEqual(train["distance_bucket"].tolist(), expected.tolist())
+
+
+# Rows as SNAPSHOT_SQL returns them: ordered by worker, one per worker/service
+# pair, and a worker without services (LEFT JOIN) in the middle
+SNAPSHOT_ROWS = [
+    (11, "Asha", 1, "Plumbing", 12.95, 75.30, 4, 6, 4.5, 300.0, True, 0),
+    (11, "Asha", 2, "Cleaning", 12.95, 75.30, 4, 6, 4.5, 250.0, True, 0),
+    (12, "Ravi", None, None, 12.97, 75.32, 0, 0, 0.0, None, True, 0),
+    (15, "Mala", 1, "Plumbing", 13.10, 75.10, 9, 9, 3.8, 500.0, True, 0),
+    (15, "Mala", 3, "Painting", 13.10, 75.10, 9, 9, 3.8, 800.0, True, 0),
+    (15, "Mala", 4, "Gardening", 13.10, 75.10, 9, 9, 3.8, 150.0, True, 0),
+]
+
+
+class FixtureResult:
+    def __init__(self, keys, rows):
+        self._keys = list(keys)
+        self._rows = list(rows)
+
+    def keys(self):
+        return self._keys
+
+    def fetchall(self):
+        return self._rows
+
+    def __iter__(self):
+        return iter(self._rows)
+
+
+class FixtureEngine:
+    """Stands in for the SQLAlchemy engine: every statement returns the given rows."""
+
+    def __init__(self, keys=CANDIDATE_KEYS, rows=SNAPSHOT_ROWS):
+        self.keys = keys
+        self.rows = rows
+        self.statements = []
+
+    @contextmanager
+    def connect(self):
+        yield self
+
+    begin = connect
+
+    def exec_driver_sql(self, sql, params=None):
+        self.statements.append((sql, params))
+        return FixtureResult(self.keys, self.rows)
+
+
+class WorkerSnapshotTests(SimpleTestCase):
+    def test_snapshot_offsets_cover_each_worker(self):
+        snapshot = load_worker_snapshot(FixtureEngine())
+
+        self.assertEqual(snapshot['starts'].tolist(), [0, 2, 3])
+        self.assertEqual(snapshot['counts'].tolist(), [2, 1, 3])
+        np.testing.assert_allclose(snapshot['lat'], [12.95, 12.97, 13.10], rtol=1e-6)
+        np.testing.assert_allclose(snapshot['lon'], [75.30, 75.32, 75.10], rtol=1e-6)
+        rows = rows_for_workers(snapshot['starts'], snapshot['counts'], np.array([2, 0]))
+        self.assertEqual(snapshot['rows']['worker_id'][rows].tolist(), [15, 15, 15, 11, 11])
+
+    def test_empty_snapshot(self):
+        snapshot = load_worker_snapshot(FixtureEngine(rows=[]))
+
+        self.assertEqual(len(snapshot['starts']), 0)
+        self.assertEqual(len(snapshot['counts']), 0)
+        self.assertEqual(len(WorkerCatalog(snapshot).filter(any_service=True)), 0)
+
+
+class WorkerCatalogTests(SimpleTestCase):
+    """The typed per-worker arrays carried by the snapshot."""
+
+    def setUp(self):
+        self.snapshot = load_worker_snapshot(FixtureEngine())
+        self.catalog = WorkerCatalog(self.snapshot)
+
+    def test_columns_are_typed_per_worker(self):
+        snapshot = self.snapshot
+        self.assertEqual((snapshot['lat'].dtype, snapshot['rating'].dtype), (np.float32, np.float32))
+        self.assertEqual(snapshot['completed'].dtype, np.int32)
+        self.assertEqual(snapshot['services'].dtype, np.uint64)
+        self.assertEqual(snapshot['names'].tolist(), ["Asha", "Ravi", "Mala"])
+        # Cheapest service per worker; none for a worker without services
+        np.testing.assert_array_equal(snapshot['charge'], np.array([250.0, np.nan, 150.0], dtype=np.float32))
+        self.assertEqual([self.catalog.service_ids(k) for k in range(3)], [[1, 2], [], [1, 3, 4]])
+
+    def test_filter(self):
+        self.assertEqual(self.catalog.filter(services=[1]).tolist(), [0, 2])
+        self.assertEqual(self.catalog.filter(services=[1, 2], all_services=True).tolist(), [0])
+        self.assertEqual(self.catalog.filter(services=[99]).tolist(), [])
+        self.assertEqual(self.catalog.filter(any_service=True, max_charge=200).tolist(), [2])
+        self.assertEqual(self.catalog.filter(near=(12.95, 75.30), radius_km=5).tolist(), [0, 1])
+        self.assertEqual(self.catalog.filter(near=(12.95, 75.30), radius_km=5, any_service=True).tolist(), [0])
+
+    def test_rows_decode_names(self):
+        cols = self.catalog.rows(np.array([2, 5]))
+        self.assertEqual(cols['worker_name'].tolist(), ["Ravi", "Mala"])
+        self.assertEqual(cols['worker_id'].tolist(), [12, 15])
+
+    def test_memory_report(self):
+        report = self.catalog.memory()
+        self.assertEqual(report['total_bytes'], sum(report['columns'].values()))
+        self.assertAlmostEqual(report['bytes_per_100k_workers'], report['total_bytes'] * 100_000 / 3)
+
+
+@override_settings(RECOMMENDER_CANDIDATES={'radii_km': [5, None], 'min_workers': 2, 'max_workers': 300})
+class WorkerIndexTests(SimpleTestCase):
+    """The grid index must hand back what fetch_candidates' SQL would."""
+
+    user = mock.Mock(x=75.30, y=12.95)
+
+    def test_build_from_snapshot(self):
+        index = build_worker_index(FixtureEngine())
+
+        self.assertEqual(len(index), 3)
+        ids, distances = index.nearest(12.95, 75.30, 2)
+        self.assertEqual(ids.tolist(), [11, 12])
+        self.assertEqual(distances[0], 0.0)
+
+    def test_candidates_stop_at_the_first_radius_with_enough_workers(self):
+        cols = build_worker_index(FixtureEngine()).candidates(self.user, past_services=[1])
+
+        # Workers 11 and 12 are within 5 km; 15 is ~28 km away
+        self.assertEqual(cols['worker_id'].tolist(), [11, 11, 12])
+        self.assertEqual(cols['service_match'].tolist(), [1, 0, 0])
+
+    def test_candidates_requiring_a_service(self):
+        cols = build_worker_index(FixtureEngine()).candidates(self.user, past_services=[1], require_service=True)
+
+        # Worker 12 offers nothing, so only one worker counts at 5 km and the search widens
+        self.assertEqual(cols['worker_id'].tolist(), [11, 11, 15, 15, 15])
+        self.assertEqual(cols['service_id'].tolist(), [1, 2, 1, 3, 4])
+
+    @override_settings(RECOMMENDER_SPATIAL_INDEX={'enabled': True})
+    def test_bulk_candidates_match_fetch_candidates_for_a_user_with_history(self):
+        with mock.patch('core.spatial_index.get_worker_index', return_value=build_worker_index(FixtureEngine())):
+            expected = fetch_candidates(FixtureEngine(), self.user, [1], require_service=True)
+        user = {'user_id': 1, 'lat': 12.95, 'lon': 75.30, 'has_bookings': True, 'past_services': [1], 'avg_rating': 4.0}
+
+        with mock.patch('core.bulk_recommend.rank_candidates', return_value=[]) as rank:
+            recommend_chunk([user], snapshot=load_worker_snapshot(FixtureEngine()), model=mock.Mock())
+
+        cols = rank.call_args.args[0]
+        for name in ('worker_id', 'service_id', 'service_match'):
+            self.assertEqual(sorted(cols[name].tolist()), sorted(expected[name].tolist()), name)
+
+
+class PreloadTests(SimpleTestCase):
+    """What gunicorn's when_ready runs in the master when RECOMMENDER_PRELOAD is enabled."""
+
+    def preload(self, **options):
+        settings = override_settings(RECOMMENDER_PRELOAD={**preloading.DEFAULT_PRELOAD_OPTIONS, 'enabled': True, **options})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        for patcher in (mock.patch('core.ml_model.get_model'),
+                        mock.patch.object(preloading, '_snapshot', None),
+                        mock.patch.object(preloading, '_shm', None)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(gc.unfreeze)
+        self.addCleanup(preloading.release)
+        return preloading.preload(FixtureEngine())
+
+    def assert_snapshot(self, snapshot):
+        self.assertEqual(snapshot['starts'].tolist(), [0, 2, 3])
+        self.assertEqual(snapshot['counts'].tolist(), [2, 1, 3])
+        self.assertFalse(snapshot['lat'].flags.writeable)
+        self.assertIs(preloading.worker_snapshot(), snapshot)
+
+    def test_preload_in_process(self):
+        self.assert_snapshot(self.preload())
+
+    def test_preload_into_shared_memory(self):
+        snapshot = self.preload(shared_memory=True, shared_memory_name=f"reco_test_{os.getpid()}")
+        self.assert_snapshot(snapshot)
+        self.assertEqual(snapshot['services'].shape, (3, 1))
+        cols = WorkerCatalog(snapshot).rows(slice(None))
+        self.assertEqual(cols['worker_name'].tolist(), [row[1] for row in SNAPSHOT_ROWS])
+
+    def test_worker_index_starts_from_the_preloaded_snapshot(self):
+        record_worker_change(11)  # make sure the change log exists
+        self.preload()
+        mock.patch.object(spatial_index, '_index', None).start()
+        self.addCleanup(mock.patch.stopall)
+        record_worker_change(12)
+        engine = FixtureEngine()
+
+        index = get_worker_index(engine)
+
+        # No fresh snapshot; only the worker changed since the preload is re-read
+        self.assertEqual(len(index), 3)
+        self.assertEqual(engine.statements, [(WORKER_ROWS_SQL, {'worker_ids': [12]})])
+
+
+class WorkerDataQueueTests(SimpleTestCase):
+    """Deferred UserWorkerData recomputes, drained with flush_worker_data() instead of the thread."""
+
+    def make_queue(self, batch_size=500, max_pending=100):
+        queue = WorkerDataQueue(flush_interval=1.0, batch_size=batch_size, max_pending=max_pending)
+        self.addCleanup(mock.patch.stopall)
+        mock.patch.object(worker_data, '_queue', queue).start()
+        mock.patch.object(WorkerDataQueue, '_ensure_running').start()
+        recompute = mock.patch('core.worker_data.recompute_worker_data').start()
+        return queue, recompute
+
+    def test_repeated_changes_are_recomputed_once(self):
+        queue, recompute = self.make_queue()
+        for worker_id in (7, 3, 7, 7, 3, 9):
+            queue.enqueue(worker_id)
+
+        flush_worker_data()
+
+        recompute.assert_called_once_with([3, 7, 9])
+        stats = queue.stats()
+        self.assertEqual((stats['pending'], stats['enqueued'], stats['recomputed']), (0, 6, 3))
+
+    def test_flush_recomputes_in_batches(self):
+        queue, recompute = self.make_queue(batch_size=2)
+        for worker_id in range(5):
+            queue.enqueue(worker_id)
+
+        flush_worker_data()
+
+        self.assertEqual([c.args[0] for c in recompute.call_args_list], [[0, 1], [2, 3], [4]])
+
+    def test_failed_batch_is_requeued(self):
+        queue, recompute = self.make_queue()
+        recompute.side_effect = [RuntimeError("database went away"), None]
+        queue.enqueue(1)
+        queue.enqueue(2)
+
+        with self.assertLogs('core.worker_data', 'ERROR'):
+            flush_worker_data()
+        self.assertEqual(queue.stats()['pending'], 2)
+        self.assertEqual(queue.stats()['failures'], 1)
+
+        flush_worker_data()
+        self.assertEqual(recompute.call_args_list[-1].args[0], [1, 2])
+        self.assertEqual(queue.stats()['pending'], 0)
+
+    def test_full_queue_recomputes_in_the_caller(self):
+        queue, recompute = self.make_queue(max_pending=2)
+        for worker_id in (1, 2, 1, 3):
+            queue.enqueue(worker_id)
+
+        recompute.assert_called_once_with([3])
+        self.assertEqual(queue.stats()['pending'], 2)
+        self.assertEqual(queue.stats()['inline'], 1)
+
+
+class SharedCacheTests(SimpleTestCase):
+    """ETags and the event stream rely on counters every server process can see."""
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_is_not_shared(self):
+        self.assertFalse(shared_cache())
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'reco_cache'}})
+    def test_database_cache_is_shared(self):
+        self.assertTrue(shared_cache())
+
+
+class WorkerRatingTotalsTests(TestCase):
+    """Reviews move Worker.rating_sum/total_reviews with F() deltas; the backfill must give them a true start."""
+
+    def test_review_on_an_existing_worker_keeps_the_average(self):
+        user = AuthenticatedUser.objects.create_user(email="user@example.com", password="x", name="User")
+        worker = Worker.objects.create(
+            user=AuthenticatedUser.objects.create_user(email="worker@example.com", password="x", name="Worker"),
+        )
+        service = Service.objects.create(service_type="Plumbing", description="", base_coins_cost=10)
+        booking = Booking.objects.create(user=user, worker=worker, service=service)
+        for rating in (4, 5):
+            UserReview.objects.create(user=user, worker=worker, booking=booking, rating=rating)
+        # A worker reviewed before rating_sum existed: count and average set, sum still 0
+        Worker.objects.filter(pk=worker.pk).update(rating_sum=0, total_reviews=2, average_rating=4.5)
+
+        backfill = importlib.import_module('core.migrations.0042_worker_rating_sum')
+        with connection.cursor() as cursor:
+            cursor.execute(backfill.RATING_TOTALS_SQL)
+        UserReview.objects.create(user=user, worker=worker, booking=booking, rating=3)
+
+        worker.refresh_from_db()
+        self.assertEqual((worker.rating_sum, worker.total_reviews, worker.average_rating), (12, 3, 4.0))
+
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_PROBE = """
+import sys, time
+import django
+django.setup()
+started = time.perf_counter()
+import core.views
+print(time.perf_counter() - started)
+print(",".join(name for name in sys.argv[1:] if name in sys.modules))
+"""
+
+
+class ImportTimeTests(SimpleTestCase):
+    """``import core.views`` is paid by every gunicorn worker, management command and test run."""
+
+    budget_seconds = float(os.environ.get('CORE_VIEWS_IMPORT_BUDGET', '1.5'))
+    lazy_modules = ('pandas', 'sqlalchemy', 'shapely', 'lightgbm', 'razorpay', 'google.oauth2', 'Crypto')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Fresh interpreter, so nothing is already in sys.modules from other tests
+        result = subprocess.run(
+            [sys.executable, '-c', IMPORT_PROBE, *cls.lazy_modules],
+            capture_output=True, text=True, check=True, cwd=PROJECT_DIR,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'serviceplatform.settings')},
+        )
+        elapsed, loaded = result.stdout.splitlines()[-2:]
+        cls.import_seconds = float(elapsed)
+        cls.loaded_modules = [name for name in loaded.split(',') if name]
+
+    def test_import_stays_within_budget(self):
+        self.assertLess(
+            self.import_seconds, self.budget_seconds,
+            f"import core.views took {self.import_seconds:.2f}s (budget {self.budget_seconds:.2f}s)",
+        )
+
+    def test_heavy_dependencies_are_loaded_lazily(self):
+        self.assertEqual(self.loaded_modules, [])
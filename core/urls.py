@@ -1,5 +1,6 @@
 from django.urls import path
 from . import views
+from .events import event_stream
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -13,6 +14,8 @@ urlpatterns =[
     path('user-profile/', views.user_profile, name="user-profile"),
     path('csrf/', views.csrf),
     path('recommend/<int:user_id>/', views.recommend_view, name='recommend'),
+    path('recommend/pool-stats/', views.recommend_pool_stats, name='recommend_pool_stats'),
+    path('events/', event_stream, name='event_stream'),
     path('bookings/', views.BookingCreateView.as_view(), name='booking-create'),
     path('user/bookings/', views.user_booking_history, name='user-bookings'),
     path('bookings/<int:booking_id>/cancel/',views.BookingCancelView.as_view(), name='booking-cancel'),
@@ -0,0 +1,115 @@
+# core/versions.py
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+# Change counters kept in the cache so recommend_view can answer a conditional
+# GET without touching the database. With more than one server process the
+# default cache must be shared (Redis/Memcached), see settings.CACHES.
+WORKERS_VERSION_KEY = "reco:version:workers"
+
+
+def user_version_key(user_id):
+    return f"reco:version:user:{user_id}"
+
+
+def _fresh_value():
+    # Used when a counter is missing (first use, eviction, restart) so that
+    # no ETag handed out before can ever match again
+    return time.time_ns()
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _fresh_value(), None)
+
+
+def shared_cache():
+    """
+    True when the default cache is visible to every server process. With a
+    process-local backend each worker keeps its own counters, so an ETag or
+    version handed out by one process means nothing to the next.
+    """
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def bump_workers_version():
+    """Worker availability/location, WorkerService rows or ratings changed."""
+    _bump(WORKERS_VERSION_KEY)
+
+
+def bump_user_version(user_id):
+    """The user's location or bookings changed."""
+    _bump(user_version_key(user_id))
+
+
+def recommendation_version(user_id):
+    """Cheap token that changes whenever anything feeding the user's recommendations changes."""
+    keys = [WORKERS_VERSION_KEY, user_version_key(user_id)]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, _fresh_value(), None)
+            values[key] = cache.get(key)
+    return "-".join(str(values[key]) for key in keys)
+
+
+def worker_jobs_version_key(worker_id):
+    return f"jobs:version:worker:{worker_id}"
+
+
+def bump_worker_jobs_version(worker_id):
+    """A booking assigned to the worker was created or changed status."""
+    _bump(worker_jobs_version_key(worker_id))
+
+
+def worker_jobs_version(worker_id):
+    key = worker_jobs_version_key(worker_id)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, _fresh_value(), None)
+        value = cache.get(key)
+    return str(value)
+
+
+# Change log of worker ids, replayed by the in-memory worker indexes of every
+# process (see core/spatial_index.py) so they stay current without a rebuild.
+WORKER_CHANGES_SEQ_KEY = "reco:workers:changes:seq"
+WORKER_CHANGE_TTL = 3600
+
+
+def worker_change_key(seq):
+    return f"reco:workers:change:{seq}"
+
+
+def record_worker_change(worker_id):
+    """The worker's location, availability, services or booking counts changed."""
+    try:
+        seq = cache.incr(WORKER_CHANGES_SEQ_KEY)
+    except ValueError:
+        # Log lost (first use, eviction): jump far enough that readers rebuild
+        seq = _fresh_value()
+        cache.set(WORKER_CHANGES_SEQ_KEY, seq, None)
+    cache.set(worker_change_key(seq), worker_id, WORKER_CHANGE_TTL)
+
+
+def invalidate_worker_changes():
+    """Bulk change to many workers: make every reader rebuild instead of replaying."""
+    cache.set(WORKER_CHANGES_SEQ_KEY, _fresh_value(), None)
+
+
+def worker_changes_seq():
+    return cache.get(WORKER_CHANGES_SEQ_KEY, 0)
+
+
+def worker_changes_between(start, end):
+    """Ids of workers changed after sequence ``start`` up to ``end``; None if entries have expired."""
+    keys = [worker_change_key(seq) for seq in range(start + 1, end + 1)]
+    found = cache.get_many(keys)
+    if len(found) != len(keys):
+        return None
+    return set(found.values())
@@ -1,29 +1,30 @@
 from django.contrib.auth import get_user_model, authenticate, login
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError as DjangoValidationError
-from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode, parse_etags, quote_etag
 from django.utils.encoding import force_bytes, force_str
 from django.contrib.auth.tokens import default_token_generator
 from django.core.mail import send_mail
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
 from django.views.decorators.csrf import ensure_csrf_cookie
 from rest_framework import permissions
 from .models import *
 from datetime import timedelta
 from rest_framework.decorators import api_view, permission_classes,action
-from rest_framework.permissions import IsAuthenticated,AllowAny
+from rest_framework.permissions import IsAuthenticated,AllowAny,IsAdminUser
 from rest_framework.response import Response
 from django.contrib.gis.geos import Point as GEOSPoint
 from .serializer import *
 from django.http import JsonResponse
-from .data_prep import *# load_df returns DataFrame
-from shapely.geometry import Point
 from django.conf import settings
-import pandas as pd
-from sqlalchemy import create_engine
-from core.ml_model import recommendation_model  # Your pre-loaded LightGBM model
-from core.utils import haversine_vector
+from core.db import get_engine, pool_stats
+from core.inference import batcher_stats
+from core.worker_data import worker_data_stats
+from core.preload import process_memory
+from core.versions import recommendation_version, shared_cache
+from core.ml_model import get_model
+from core.recommend import (
+    StageTimer, cascade_options, get_materialized_recommendations, materialize_recommendations_once,
+)
 from rest_framework.views import APIView
 from rest_framework.generics import ListAPIView
 from rest_framework import status,viewsets
@@ -31,34 +32,40 @@ from django.shortcuts import get_object_or_404
 import os
 import json
 import base64
-from Crypto.Cipher import AES, PKCS1_OAEP
-from Crypto.Util.Padding import unpad
+import functools
 import hashlib
-from Crypto.PublicKey import RSA
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.core.files.base import ContentFile
 from django.views.decorators.csrf import csrf_exempt
-import razorpay
 import hmac
 from decimal import Decimal
 
 User = get_user_model()
 
-# Load RSA private key securely (store private.pem safely on your server)
+# RSA private key (store private.pem safely on your server), read on first use
 PRIVATE_KEY_PATH = os.path.join(settings.BASE_DIR, 'private.pem')
-with open(PRIVATE_KEY_PATH, 'rb') as key_file:
-    PRIVATE_KEY = RSA.import_key(key_file.read())
+
+
+@functools.cache
+def get_private_key():
+    from Crypto.PublicKey import RSA
+    with open(PRIVATE_KEY_PATH, 'rb') as key_file:
+        return RSA.import_key(key_file.read())
+
 
 def decrypt_rsa(encrypted_b64):
+    from Crypto.Cipher import PKCS1_OAEP
     try:
         encrypted_data = base64.b64decode(encrypted_b64)
-        cipher_rsa = PKCS1_OAEP.new(PRIVATE_KEY)
+        cipher_rsa = PKCS1_OAEP.new(get_private_key())
         decrypted = cipher_rsa.decrypt(encrypted_data)
         return decrypted  # bytes representing AES key
     except Exception:
         return None
 
 def decrypt_aes(encrypted_b64, aes_key):
+    from Crypto.Cipher import AES
+    from Crypto.Util.Padding import unpad
     try:
         encrypted_data = base64.b64decode(encrypted_b64)
         iv = encrypted_data[:16]
@@ -254,6 +261,9 @@ def password_reset_confirm(request, uidb64, token):
 
 @api_view(['POST'])
 def google_social_login(request):
+    from google.oauth2 import id_token
+    from google.auth.transport import requests as google_requests
+
     token = request.data.get('token')
     if not token:
         return Response({"error": "Token is required."}, status=status.HTTP_400_BAD_REQUEST)
@@ -281,248 +291,70 @@ def google_social_login(request):
     })
 
 
-def build_user_locs_dict(engine):
-    user_locs = pd.read_sql("""
-        SELECT id,
-               ST_Y(location::geometry) AS lat,
-               ST_X(location::geometry) AS lon
-        FROM core_authenticateduser
-        WHERE location IS NOT NULL;
-    """, engine)
-    return {row["id"]: Point(row["lon"], row["lat"]) for _, row in user_locs.iterrows()}
-
-def user_has_single_worker_repeated(user_id, engine, threshold=3):
-    query = """
-        SELECT worker_id
-        FROM bookings
-        WHERE user_id = %s
-        ORDER BY id DESC
-        LIMIT %s;
-    """
-    bookings = pd.read_sql(query, engine, params=(user_id, threshold))
-    return bookings['worker_id'].nunique() == 1 if not bookings.empty else False
-
-import pandas as pd
-import numpy as np
-from .utils import haversine_vector  # Make sure this exists in core/utils.py
-
-def recommend_top_n_for_user(user_id, model, engine, top_n=5):
-    """
-    Recommend top N workers for a user:
-    - New user: location, rating, bookings, charge
-    - Existing user: combination of
-        1. Workers offering past services (familiar)
-        2. Nearby high-rated workers not offering past services (exploration)
-    """
-    user_locs_dict = build_user_locs_dict(engine)
-    user_point = user_locs_dict.get(user_id)
-    if not user_point:
-        return []
-
-    # Load all bookings
-    df = load_df(engine)
-
-    # Check if user is new
-    user_bookings_count = pd.read_sql(
-        "SELECT COUNT(*) AS cnt FROM bookings WHERE user_id = %s",
-        engine,
-        params=(user_id,)
-    )
-    is_new_user = True
-    if not user_bookings_count.empty and user_bookings_count.iloc[0]['cnt'] > 0:
-        is_new_user = False
-
-    if is_new_user:
-        return recommend_top_n_for_user_new(user_id, engine, user_point, top_n)
-
-    # Existing user
-    past_services = df[df["user_id"] == user_id]["service_id"].unique().tolist()
-    if not past_services:
-        return recommend_top_n_for_user_new(user_id, engine, user_point, top_n)
-
-    # --- 1️⃣ Workers offering past services ---
-    familiar_df = pd.read_sql(f"""
-        SELECT w.id AS worker_id,
-               wu.name AS worker_name,
-               s.id AS service_id,
-               s.service_type AS service_name,
-               ST_Y(w.location::geometry) AS worker_lat,
-               ST_X(w.location::geometry) AS worker_lon,
-               COALESCE(b.total_bookings,0) AS num_bookings,
-               w.average_rating AS total_rating,
-               ws.charge,
-               w.is_available,
-               1 AS service_match
-        FROM workers w
-        LEFT JOIN worker_services ws ON w.id = ws.worker_id
-        LEFT JOIN core_service s ON ws.service_id = s.id
-        LEFT JOIN core_authenticateduser wu ON w.user_id = wu.id
-        LEFT JOIN (
-            SELECT worker_id, COUNT(*) AS total_bookings
-            FROM bookings
-            WHERE status = 'completed'
-            GROUP BY worker_id
-        ) b ON w.id = b.worker_id
-        WHERE w.is_available = TRUE AND w.location IS NOT NULL
-          AND s.id IN ({','.join([str(s) for s in past_services])})
-    """, engine)
-
-    # --- 2️⃣ Nearby workers not offering past services (exploration) ---
-    explore_df = pd.read_sql(f"""
-        SELECT w.id AS worker_id,
-               wu.name AS worker_name,
-               s.id AS service_id,
-               s.service_type AS service_name,
-               ST_Y(w.location::geometry) AS worker_lat,
-               ST_X(w.location::geometry) AS worker_lon,
-               COALESCE(b.total_bookings,0) AS num_bookings,
-               w.average_rating AS total_rating,
-               ws.charge,
-               w.is_available,
-               0 AS service_match
-        FROM workers w
-        LEFT JOIN worker_services ws ON w.id = ws.worker_id
-        LEFT JOIN core_service s ON ws.service_id = s.id
-        LEFT JOIN core_authenticateduser wu ON w.user_id = wu.id
-        LEFT JOIN (
-            SELECT worker_id, COUNT(*) AS total_bookings
-            FROM bookings
-            WHERE status = 'completed'
-            GROUP BY worker_id
-        ) b ON w.id = b.worker_id
-        WHERE w.is_available = TRUE AND w.location IS NOT NULL
-          AND s.id NOT IN ({','.join([str(s) for s in past_services])})
-    """, engine)
-
-    # --- Filter out empty DataFrames to avoid concat warning ---
-    frames = [df for df in [familiar_df, explore_df] if not df.empty]
-    if not frames:
-        return recommend_top_n_for_user_new(user_id, engine, user_point, top_n)
-    cand_df = pd.concat(frames, ignore_index=True)
-
-    # Fill nulls with explicit dtypes to avoid downcasting warnings
-    cand_df["total_rating"] = cand_df["total_rating"].fillna(0.0).astype(float)
-    cand_df["charge"] = cand_df["charge"].fillna(0.0).astype(float)
-    cand_df["num_bookings"] = cand_df["num_bookings"].fillna(0).astype(int)
-
-    # Distance from user
-    cand_df['distance_km'] = haversine_vector(
-        user_point.y, user_point.x,
-        cand_df['worker_lat'], cand_df['worker_lon']
-    )
-
-    # Score formula
-    cand_df['score'] = (
-        (-1 * cand_df['distance_km']) +
-        cand_df['total_rating'] * 1.0 +
-        cand_df['num_bookings'] * 0.5 +
-        cand_df['service_match'] * 1.0 -   # bonus if familiar service
-        cand_df['charge'] * 0.2
-    )
-
-    # Aggregate workers (avoid duplicates)
-    cand_df = cand_df.groupby('worker_id', as_index=False).agg({
-        'worker_name': 'first',
-        'service_name': 'first',
-        'worker_lat': 'first',
-        'worker_lon': 'first',
-        'charge': 'mean',
-        'num_bookings': 'sum',
-        'total_rating': 'mean',
-        'is_available': 'first',
-        'distance_km': 'min',
-        'service_match': 'max',
-        'score': 'max'
-    })
-
-    # Sort and return top N
-    top_workers = cand_df.sort_values('score', ascending=False).head(top_n)
-    return top_workers.to_dict(orient='records')
-
-
-def recommend_top_n_for_user_new(user_id, engine, user_point, top_n=5):
-    """
-    Fallback / new user recommendations
-    """
-    cand_df = pd.read_sql("""
-        SELECT w.id AS worker_id,
-               wu.name AS worker_name,
-               s.service_type AS service_name,
-               ST_Y(w.location::geometry) AS worker_lat,
-               ST_X(w.location::geometry) AS worker_lon,
-               COALESCE(b.total_bookings,0) AS num_bookings,
-               w.average_rating AS total_rating,
-               ws.charge,
-               w.is_available
-        FROM workers w
-        LEFT JOIN core_authenticateduser wu ON w.user_id = wu.id
-        LEFT JOIN worker_services ws ON w.id = ws.worker_id
-        LEFT JOIN core_service s ON ws.service_id = s.id
-        LEFT JOIN (
-            SELECT worker_id, COUNT(*) AS total_bookings
-            FROM bookings
-            WHERE status = 'completed'
-            GROUP BY worker_id
-        ) b ON w.id = b.worker_id
-        WHERE w.is_available = TRUE AND w.location IS NOT NULL
-    """, engine)
-
-    if cand_df.empty:
-        return []
-
-    # Fill nulls with explicit dtypes
-    cand_df["num_bookings"] = cand_df["num_bookings"].fillna(0).astype(int)
-    cand_df["total_rating"] = cand_df["total_rating"].fillna(0.0).astype(float)
-    cand_df["charge"] = cand_df["charge"].fillna(0.0).astype(float)
-
-    # Distance
-    cand_df['distance_km'] = haversine_vector(
-        user_point.y, user_point.x,
-        cand_df['worker_lat'], cand_df['worker_lon']
-    )
-
-    # Score
-    cand_df['score'] = (
-        (-1 * cand_df['distance_km']) +
-        cand_df['num_bookings'] * 0.5 +
-        cand_df['total_rating'] * 1.0 -
-        cand_df['charge'] * 0.2
-    )
-
-    cand_df = cand_df.groupby('worker_id', as_index=False).agg({
-        'worker_name': 'first',
-        'service_name': 'first',
-        'worker_lat': 'first',
-        'worker_lon': 'first',
-        'charge': 'mean',
-        'num_bookings': 'sum',
-        'total_rating': 'mean',
-        'is_available': 'first',
-        'distance_km': 'min',
-        'score': 'max'
-    })
-
-    top_workers = cand_df.sort_values('score', ascending=False).head(top_n)
-    return top_workers.to_dict(orient='records')
+def _recommendation_response(data, etag, timer=None):
+    response = Response(data, status=status.HTTP_304_NOT_MODIFIED if data is None else status.HTTP_200_OK)
+    if etag is not None:
+        response['ETag'] = etag
+    # Let the browser keep the body but revalidate on every poll
+    response['Cache-Control'] = 'private, no-cache'
+    if timer is not None:
+        response['Server-Timing'] = timer.server_timing()
+    if data is not None:
+        response['X-Model-Version'] = data['model_version']
+    return response
 
 
 @api_view(['GET'])
 def recommend_view(request, user_id):
-    db_settings = settings.DATABASES['default']
-    user = db_settings['USER']
-    password = db_settings['PASSWORD']
-    host = db_settings['HOST']
-    port = db_settings['PORT']
-    dbname = db_settings['NAME']
-
-    conn_str = f"postgresql://{user}:{password}@{host}:{port}/{dbname}"
-    engine = create_engine(conn_str)
-
-    model = recommendation_model
+    # Promoted ranker (hot-swapped by the registry); a new version changes the ETag
+    model = get_model()
+
+    # Nothing relevant changed since the client's copy: answer from cache counters alone.
+    # The counters only mean something when every process shares them, so with a
+    # process-local cache there is no ETag and every request gets a full answer.
+    etag = None
+    if shared_cache():
+        etag = quote_etag(f"reco-{recommendation_version(user_id)}-{model.version}")
+        client_etags = parse_etags(request.headers.get('If-None-Match', ''))
+        if any(tag.removeprefix('W/') == etag for tag in client_etags):
+            return _recommendation_response(None, etag)
+
+    # Fresh materialized entry: a single primary-key read
+    stored = get_materialized_recommendations(user_id, model_version=model.version)
+    if stored is not None:
+        return _recommendation_response({
+            'user_id': user_id,
+            'recommendations': stored['recommendations'],
+            'computed_at': stored['computed_at'],
+            'model_version': stored['model_version'],
+        }, etag)
+
+    engine = get_engine()
+
+    timer = StageTimer(budget_ms=cascade_options()['budget_ms'])
+    recommendations, computed_at = materialize_recommendations_once(int(user_id), model, engine, timer=timer)
+
+    return _recommendation_response(
+        {
+            'user_id': user_id,
+            'recommendations': recommendations,
+            'computed_at': computed_at,
+            'model_version': model.version,
+        },
+        etag,
+        timer,
+    )
 
-    recommendations = recommend_top_n_for_user(int(user_id), model, engine)
 
-    return Response({'user_id': user_id, 'recommendations': recommendations or []})
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def recommend_pool_stats(request):
+    return Response({
+        **pool_stats(),
+        'memory': process_memory(),
+        'batcher': batcher_stats(),
+        'worker_data': worker_data_stats(),
+    })
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
@@ -596,6 +428,9 @@ class BookingCreateView(APIView):
         Decrypt AES-CBC encrypted data (with first 16 bytes as IV).
         Handles padding issues by stripping null bytes if unpad fails.
         """
+        from Crypto.Cipher import AES
+        from Crypto.Util.Padding import unpad
+
         if len(encrypted_bytes) < 16:
             raise ValueError("Invalid encrypted data length")
 
@@ -694,7 +529,7 @@ class BookingCancelView(APIView):
         if timezone.now() - booking.booking_time > timedelta(minutes=5):
             return Response({"error": "Cancellation period expired."}, status=400)
         booking.status = "cancelled"
-        booking.save()
+        booking.save_status()
         return Response({"message": "Booking cancelled."})
     
 
@@ -758,7 +593,7 @@ def accept_job(request):
         
         job.worker = worker
         job.status = 'in_progress'
-        job.save()
+        job.save_status(update_fields=['worker', 'status'])
         
         worker.is_available = False
         worker.save()
@@ -926,7 +761,7 @@ def pay_job(request):
     booking.payment_received = True
     if booking.status == 'booked':
         booking.status = 'in_progress'
-    booking.save(update_fields=['payment_received', 'status'])
+    booking.save_status(update_fields=['payment_received', 'status'])
 
     return Response(
         {'message': 'Payment recorded successfully.'},
@@ -981,7 +816,12 @@ def get_booking_detail(request, booking_id):
         return Response({'error': 'Booking not found'}, status=404)
 
 
-client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
+@functools.cache
+def get_razorpay_client():
+    import razorpay
+    return razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def create_razorpay_order(request):
@@ -994,7 +834,7 @@ def create_razorpay_order(request):
             return Response({'error': 'Invalid total amount for payment'}, status=400)
 
         amount_paise = int(booking.total * 100)
-        razorpay_order = client.order.create(dict(
+        razorpay_order = get_razorpay_client().order.create(dict(
             amount=amount_paise,
             currency="INR",
             payment_capture=1,
@@ -1014,7 +854,7 @@ def create_razorpay_order(request):
         booking.payment_status = 'pending'
         booking.save(update_fields=['payment_method', 'payment_status'])
         booking.status = "progress"  # update the status here
-        booking.save(update_fields=['payment_received', 'payment_status', 'status'])
+        booking.save_status(update_fields=['payment_received', 'payment_status', 'status'])
         return Response({
             'order_id': razorpay_order['id'],
             'amount': amount_paise,
@@ -1069,7 +909,7 @@ def verify_payment(request):
     booking.payment_received = True
     booking.payment_status = 'paid'
     booking.status = 'in_progress'  # Update status as needed
-    booking.save(update_fields=['payment_method', 'payment_received', 'payment_status', 'status'])
+    booking.save_status(update_fields=['payment_method', 'payment_received', 'payment_status', 'status'])
 
     return Response({"message": "Payment verified successfully"})
 
@@ -1101,7 +941,7 @@ def confirm_cod_payment(request):
         booking.payment_status = 'paid'
         booking.payment_received = True
         booking.status = 'completed'  # Change status to completed on payment confirm
-        booking.save(update_fields=['payment_status', 'payment_received', 'status'])
+        booking.save_status(update_fields=['payment_status', 'payment_received', 'status'])
         return Response({'detail': 'COD payment confirmed and job completed'})
     except Worker.DoesNotExist:
         return Response({'error': 'Worker profile not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -1119,7 +959,7 @@ def complete_job(request):
         job = Booking.objects.get(id=job_id, worker__user=user, status='in_progress')
         job.status = 'completed'
         job.completed_at = timezone.now()
-        job.save(update_fields=['status', 'completed_at'])
+        job.save_status(update_fields=['status', 'completed_at'])
 
         WorkerEarning.objects.create(
             worker=job.worker,
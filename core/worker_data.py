@@ -0,0 +1,295 @@
+# core/worker_data.py
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Deferred UserWorkerData maintenance. A booking change only records "this
+# worker's row needs recomputing" once its transaction commits; a background
+# thread drains the pending set every flush_interval seconds and recomputes the
+# rows in batches with REBUILD_SQL, so a burst of saves on the same booking or
+# worker collapses into one recompute and the live path and
+# manage.py rebuild_user_worker_data can never disagree.
+DEFAULT_WORKER_DATA_OPTIONS = {
+    "deferred": True,
+    "flush_interval": 1.0,   # seconds the drainer lets changes accumulate
+    "batch_size": 500,       # workers recomputed per statement
+    "max_pending": 10000,    # beyond this, new workers are recomputed in the caller
+}
+
+
+def worker_data_options():
+    return {**DEFAULT_WORKER_DATA_OPTIONS, **getattr(settings, 'RECOMMENDER_WORKER_DATA', {})}
+
+
+def recompute_worker_data(worker_ids):
+    """
+    Bring UserWorkerData in line for the given workers: one row per worker
+    describing its latest booking. Returns (written, removed).
+    """
+    from .db import get_engine
+
+    return rebuild_worker_data(get_engine(), worker_ids=worker_ids)
+
+
+# UserWorkerData for a batch of workers (an id range, or a list of ids): the
+# latest booking per worker (by booking_time, then id) defines its row, rows for
+# any other (user, service) of those workers are dropped. Returns the user ids
+# whose rows changed, for cache invalidation.
+REBUILD_SQL = """
+    WITH latest AS (
+        SELECT DISTINCT ON (b.worker_id)
+               b.worker_id, b.user_id, b.service_id, COALESCE(b.tariff_coins, 0) AS charge
+        FROM bookings b
+        WHERE b.worker_id {in_batch} AND b.service_id IS NOT NULL
+        ORDER BY b.worker_id, b.booking_time DESC, b.id DESC
+    ),
+    fresh AS (
+        SELECT l.user_id,
+               l.service_id,
+               l.worker_id,
+               w.location::geometry AS worker_location,
+               s.service_type AS service_name,
+               w.experience_years AS worker_experience,
+               l.charge,
+               w.total_bookings AS num_bookings,
+               COALESCE(r.avg_rating, 0) AS total_rating,
+               ST_Y(w.location::geometry) AS worker_latitude,
+               ST_X(w.location::geometry) AS worker_longitude
+        FROM latest l
+        JOIN workers w ON w.id = l.worker_id AND w.location IS NOT NULL
+        JOIN core_service s ON s.id = l.service_id
+        LEFT JOIN (
+            SELECT worker_id, AVG(rating) AS avg_rating
+            FROM core_userreview
+            WHERE worker_id {in_batch}
+            GROUP BY worker_id
+        ) r ON r.worker_id = l.worker_id
+    ),
+    removed AS (
+        DELETE FROM user_worker_data u
+        WHERE u.worker_id {in_batch}
+          AND NOT EXISTS (
+              SELECT 1 FROM fresh
+              WHERE fresh.worker_id = u.worker_id AND fresh.user_id = u.user_id AND fresh.service_id = u.service_id
+          )
+        RETURNING u.user_id
+    ),
+    written AS (
+        INSERT INTO user_worker_data (
+            user_id, service_id, worker_id, worker_location, service_name, worker_experience,
+            charge, num_bookings, total_rating, worker_latitude, worker_longitude
+        )
+        SELECT user_id, service_id, worker_id, worker_location, service_name, worker_experience,
+               charge, num_bookings, total_rating, worker_latitude, worker_longitude
+        FROM fresh
+        ON CONFLICT (user_id, worker_id, service_id) DO UPDATE SET
+            worker_location = EXCLUDED.worker_location,
+            service_name = EXCLUDED.service_name,
+            worker_experience = EXCLUDED.worker_experience,
+            charge = EXCLUDED.charge,
+            num_bookings = EXCLUDED.num_bookings,
+            total_rating = EXCLUDED.total_rating,
+            worker_latitude = EXCLUDED.worker_latitude,
+            worker_longitude = EXCLUDED.worker_longitude
+        RETURNING user_id
+    )
+    SELECT 'removed' AS kind, user_id FROM removed
+    UNION ALL
+    SELECT 'written' AS kind, user_id FROM written
+"""
+
+WORKER_ID_RANGE_SQL = "SELECT MIN(id), MAX(id) FROM workers"
+
+IN_RANGE = "BETWEEN %(first_id)s AND %(last_id)s"
+IN_LIST = "= ANY(%(worker_ids)s)"
+
+
+def _rebuild_batch(engine, in_batch, params):
+    """Run one REBUILD_SQL batch; returns (written, removed)."""
+    from django.core.cache import cache
+
+    from .recommend import user_history_cache_key
+
+    with engine.begin() as conn:
+        result = conn.exec_driver_sql(REBUILD_SQL.format(in_batch=in_batch), params).fetchall()
+    written = sum(1 for kind, _ in result if kind == 'written')
+    cache.delete_many([user_history_cache_key(user_id) for user_id in {user_id for _, user_id in result}])
+    return written, len(result) - written
+
+
+def rebuild_worker_data(engine, batch_size=5000, progress=None, worker_ids=None):
+    """
+    Rebuild user_worker_data from bookings/workers/reviews for every worker
+    (one id range per statement and transaction) or just ``worker_ids``.
+    ``progress(last_id, max_id, written, removed)`` is called after each
+    batch. Returns (written, removed).
+    """
+    written = removed = 0
+    if worker_ids is not None:
+        worker_ids = sorted(worker_ids)
+        batches = [
+            (IN_LIST, {'worker_ids': worker_ids[start:start + batch_size]})
+            for start in range(0, len(worker_ids), batch_size)
+        ]
+        max_id = worker_ids[-1] if worker_ids else None
+    else:
+        with engine.connect() as conn:
+            min_id, max_id = conn.exec_driver_sql(WORKER_ID_RANGE_SQL).one()
+        batches = [] if min_id is None else [
+            (IN_RANGE, {'first_id': first_id, 'last_id': min(first_id + batch_size - 1, max_id)})
+            for first_id in range(min_id, max_id + 1, batch_size)
+        ]
+
+    for in_batch, params in batches:
+        batch_written, batch_removed = _rebuild_batch(engine, in_batch, params)
+        written += batch_written
+        removed += batch_removed
+        if progress is not None:
+            last_id = params['worker_ids'][-1] if 'worker_ids' in params else params['last_id']
+            progress(last_id, max_id, written, removed)
+    return written, removed
+
+
+class WorkerDataQueue:
+    def __init__(self, flush_interval, batch_size, max_pending):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._pending = set()   # worker ids
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._enqueued = 0
+        self._recomputed = 0
+        self._inline = 0
+        self._drains = 0
+        self._failures = 0
+
+    def enqueue(self, worker_id):
+        with self._lock:
+            full = worker_id not in self._pending and len(self._pending) >= self.max_pending
+            if not full:
+                self._pending.add(worker_id)
+            self._enqueued += 1
+        if full:
+            # The drainer is not keeping up (or the database is failing): do
+            # this one now rather than grow the queue without bound
+            self._inline += 1
+            self._recompute([worker_id])
+            return
+        self._ensure_running()
+        self._wakeup.set()
+
+    def _ensure_running(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='worker-data-drainer', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        from django.db import close_old_connections
+
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.flush_interval)
+            self._wakeup.clear()
+            self.drain()
+            close_old_connections()
+
+    def _recompute(self, worker_ids):
+        try:
+            recompute_worker_data(worker_ids)
+        except Exception:
+            logger.exception("UserWorkerData recompute failed for %d workers", len(worker_ids))
+            with self._lock:
+                self._failures += 1
+                # Back into the queue, as far as it has room
+                room = max(0, self.max_pending - len(self._pending))
+                self._pending.update(worker_ids[:room])
+            if room < len(worker_ids):
+                logger.warning("UserWorkerData queue full: %d workers left for manage.py rebuild_user_worker_data",
+                               len(worker_ids) - room)
+            return False
+        with self._lock:
+            self._recomputed += len(worker_ids)
+        return True
+
+    def drain(self):
+        """Recompute everything pending now, batch_size workers at a time."""
+        with self._lock:
+            pending, self._pending = sorted(self._pending), set()
+        for start in range(0, len(pending), self.batch_size):
+            self._recompute(pending[start:start + self.batch_size])
+        with self._lock:
+            self._drains += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "enqueued": self._enqueued,
+                "recomputed": self._recomputed,
+                "inline": self._inline,
+                "drains": self._drains,
+                "failures": self._failures,
+            }
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_worker_data_queue():
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                options = worker_data_options()
+                _queue = WorkerDataQueue(options['flush_interval'], options['batch_size'], options['max_pending'])
+    return _queue
+
+
+def schedule_worker_data(worker_id):
+    """
+    Recompute the worker's UserWorkerData row once the current transaction
+    commits: queued for the drainer, or right away with deferred off.
+    """
+    from django.db import transaction
+
+    if worker_data_options()['deferred']:
+        transaction.on_commit(lambda: get_worker_data_queue().enqueue(worker_id))
+    else:
+        transaction.on_commit(lambda: recompute_worker_data([worker_id]))
+
+
+def flush_worker_data():
+    """Apply everything queued so far in the calling thread (commands, tests, shutdown)."""
+    if _queue is not None:
+        _queue.drain()
+
+
+def worker_data_stats():
+    if _queue is None:
+        return {"deferred": worker_data_options()['deferred'], "started": False}
+    return {"deferred": worker_data_options()['deferred'], "started": True, **_queue.stats()}
+
+
+def _reset_after_fork():
+    # The drainer thread does not survive fork; children start their own
+    global _queue, _queue_lock
+    _queue = None
+    _queue_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+# Management commands and server shutdown: do not drop queued recomputes
+atexit.register(flush_worker_data)
@@ -733,33 +733,32 @@ const onToggleAvailability = async (workerId, newAvailability) => {
   useEffect(() => {
   if (!userInfo.id) return;
 
+  function applyRecommendations(data) {
+    if (!data?.recommendations?.length) {
+      setRecommendedWorkers([]);
+      return;
+    }
+    const workers = data.recommendations.map((w) => ({
+      id: w.worker_id,
+      name: w.worker_name || `Worker ${w.worker_id}`,
+      service: { service_type: w.service_name || "Service" },
+      avatar: w.avatar_url || `https://i.pravatar.cc/80?u=${w.worker_id}`,
+      rating: w.total_rating || 0,
+      costPerHour: w.charge || 0,
+      difficulty: "Medium",
+      description: w.description || "",
+      available: w.is_available === false ? false : true, // use actual availability from backend if provided
+    }));
+    setRecommendedWorkers(workers);
+  }
+
   async function fetchRecommendations() {
     setLoadingRecs(true);
     try {
       const response = await axios.get(`http://localhost:8000/api/recommend/${userInfo.id}/`, {
         withCredentials: true,
       });
-      if (!response.data?.recommendations?.length) {
-        setRecommendedWorkers([]);
-        setLoadingRecs(false);
-        return;
-      }
-      const workers = response.data.recommendations.map((w) => ({
-        id: w.worker_id,
-        name: w.worker_name || `Worker ${w.worker_id}`,
-        service: { service_type: w.service_name || "Service" },
-        avatar: w.avatar_url || `https://i.pravatar.cc/80?u=${w.worker_id}`,
-        rating: w.total_rating || 0,
-        costPerHour: w.charge || 0,
-        difficulty: "Medium",
-        description: w.description || "",
-       available: w.is_available === false ? false : true,
- // forces unavailable state for testing
-
- // use actual availability from backend if provided
-      }));
-    console.log("Mapped workers with availability:", workers); 
-      setRecommendedWorkers(workers);
+      applyRecommendations(response.data);
     } catch (error) {
       console.error("Error fetching recommendations:", error);
       setRecommendedWorkers([]);
@@ -768,11 +767,42 @@ const onToggleAvailability = async (workerId, newAvailability) => {
     }
   }
 
-  fetchRecommendations();
+  let intervalId = null;
+  function startPolling() {
+    if (intervalId) return;
+    fetchRecommendations();
+    intervalId = setInterval(fetchRecommendations, 10000); // poll every 10 seconds
+  }
 
-  const intervalId = setInterval(fetchRecommendations, 10000); // poll every 10 seconds
+  // Prefer server push; fall back to polling if the stream is unavailable
+  let source = null;
+  if (window.EventSource) {
+    let received = false;
+    setLoadingRecs(true);
+    source = new EventSource("http://localhost:8000/api/events/?topics=recommendations", {
+      withCredentials: true,
+    });
+    source.addEventListener("recommendations", (event) => {
+      received = true;
+      applyRecommendations(JSON.parse(event.data));
+      setLoadingRecs(false);
+    });
+    source.onerror = () => {
+      // Transient drops reconnect on their own; a refused stream (e.g. 204) does not
+      if (!received || source.readyState === EventSource.CLOSED) {
+        source.close();
+        startPolling();
+      }
+    };
+  } else {
+    startPolling();
+  }
 
-  return () => clearInterval(intervalId); // cleanup on unmount
+  return () => {
+    // cleanup on unmount
+    if (source) source.close();
+    if (intervalId) clearInterval(intervalId);
+  };
 }, [userInfo.id]);
 
   async function handleSaveUserProfile(newData) {
@@ -518,6 +518,20 @@ function WorkerHomepage() {
     }
 
     fetchHomepageData();
+
+    // New pending bookings and status changes are pushed by the server
+    if (!window.EventSource) return;
+    const source = new EventSource("http://localhost:8000/api/events/?topics=jobs", {
+      withCredentials: true,
+    });
+    source.addEventListener("jobs", (event) => {
+      const data = JSON.parse(event.data);
+      setActiveJob(data.activeJob);
+      setPendingRequests(data.pendingRequests || []);
+      setPaymentStatus(data.activeJob?.payment_status || "pending");
+      setTariff(data.activeJob?.tariffs || []);
+    });
+    return () => source.close();
   }, []);
 
   const toggleAvailability = async () => {
@@ -0,0 +1,31 @@
+# gunicorn -c gunicorn.conf.py
+# Serves the ASGI application through uvicorn workers, so each Server-Sent
+# Events stream (/api/events/) is a coroutine rather than a worker held for the
+# stream's lifetime. With RECOMMENDER_PRELOAD['enabled'] the ranker and worker
+# snapshot are loaded once in the master and shared copy-on-write by every
+# worker (see core/preload.py).
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+wsgi_app = os.environ.get('GUNICORN_APP', 'serviceplatform.asgi:application')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'uvicorn.workers.UvicornWorker')
+preload_app = True
+
+
+def when_ready(server):
+    from core.preload import preload, preload_options
+    if preload_options()['enabled']:
+        preload()
+        server.log.info("Preloaded recommendation model and worker snapshot")
+
+
+def worker_abort(worker):
+    # Killed on timeout: atexit does not run, so apply queued UserWorkerData recomputes here
+    from core.worker_data import flush_worker_data
+    flush_worker_data()
+
+
+def on_exit(server):
+    from core.preload import release
+    release()
@@ -3,6 +3,11 @@ ASGI config for serviceplatform project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server (e.g. ``uvicorn serviceplatform.asgi:application``)
+so the Server-Sent Events stream at /api/events/ (core.events) holds a
+coroutine per client instead of a worker thread. gunicorn.conf.py runs it under
+uvicorn workers.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -88,6 +88,122 @@ DATABASES = {
     }
 }
 
+# The recommender keeps ETag change counters and per-user history in the default
+# cache; with several server processes point this at a shared backend (Redis/Memcached).
+# Conditional GETs (304) and the recommendation event stream are switched off while
+# the backend is process-local (LocMem/Dummy), see core.versions.shared_cache.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Shared SQLAlchemy pool used by the recommender (see core/db.py)
+RECOMMENDER_DB_POOL = {
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_timeout': 30,
+    'pool_recycle': 1800,
+    'pool_pre_ping': True,
+}
+
+# Nearest-worker candidate retrieval for recommendations (see core/recommend.py)
+RECOMMENDER_CANDIDATES = {
+    'radii_km': [5, 15, 50, 200, None],
+    'min_workers': 50,
+    'max_workers': 300,
+}
+
+# 'model' scores candidates with the LightGBM ranker, 'linear' with the hand-tuned formula
+RECOMMENDER_SCORING = 'model'
+
+# Heuristic prefilter -> ranker rerank; stage two is skipped once budget_ms is spent
+RECOMMENDER_CASCADE = {
+    'prefilter_k': 100,
+    'budget_ms': 150,
+}
+
+# Materialized per-user recommendations (refresh with manage.py refresh_recommendations)
+RECOMMENDER_MATERIALIZED = {
+    'max_age_seconds': 300,
+    'active_within_hours': 24,
+}
+
+# Versioned ranker registry (manage.py model_registry list/promote/rollback).
+# Point 'path' at storage shared by all app servers.
+RECOMMENDER_MODEL_REGISTRY = {
+    'path': BASE_DIR / 'ml_models' / 'registry',
+    'check_interval': 5.0,
+}
+
+# Load the ranker and a read-only worker snapshot in the gunicorn master before
+# fork (gunicorn.conf.py); 'shared_memory' also publishes the snapshot as a named segment.
+# Workers seed RECOMMENDER_SPATIAL_INDEX from the snapshot instead of querying for one
+RECOMMENDER_PRELOAD = {
+    'enabled': False,
+    'shared_memory': False,
+    'shared_memory_name': 'reco_worker_snapshot',
+}
+
+# Gather concurrent ranker predict calls into one. Only pays off when requests rank in
+# parallel threads, i.e. a threaded WSGI worker (gunicorn gthread); under the ASGI app
+# the sync DRF views all run on one thread, so there is never a second caller to batch with
+RECOMMENDER_BATCHING = {
+    'enabled': False,
+    'max_batch': 4096,
+    'max_wait_ms': 2.0,
+}
+
+# Coalesce concurrent identical recommendation computes; cross_process needs a shared CACHES backend
+RECOMMENDER_SINGLE_FLIGHT = {
+    'cross_process': False,
+    'lock_timeout': 10,
+    'wait_timeout': 5.0,
+}
+
+# Precomputed new-user candidates per grid cell (manage.py rebuild_cell_recommendations)
+RECOMMENDER_COLD_START = {
+    'enabled': True,
+    'cell_size_deg': 0.05,
+    'workers_per_cell': 30,
+    'ring': 1,
+    'stale_ring': 2,
+    'max_age_seconds': 900,
+}
+
+# In-memory worker grid index for candidate lookups, kept current from the
+# worker change log (see core/spatial_index.py); needs a shared cache
+RECOMMENDER_SPATIAL_INDEX = {
+    'enabled': False,
+    'cell_size_deg': 0.1,
+    'sync_interval': 1.0,
+    'max_replay': 1000,
+}
+
+# UserWorkerData rows recomputed after commit by a background drainer (core/worker_data.py)
+RECOMMENDER_WORKER_DATA = {
+    'deferred': True,
+    'flush_interval': 1.0,
+    'batch_size': 500,
+    'max_pending': 10000,
+}
+
+# Prior for Worker.smoothed_rating (Bayesian average of review stars)
+RECOMMENDER_RATING_PRIOR = {
+    'mean': 3.5,
+    'weight': 5,
+}
+
+# Server-Sent Events push channel at /api/events/ (see core/events.py). Streams are
+# only served by the ASGI application with a shared CACHES backend; otherwise the
+# endpoint answers 204 and clients poll
+EVENT_STREAM = {
+    'enabled': True,
+    'check_interval': 2.0,
+    'heartbeat_interval': 15.0,
+    'max_stream_seconds': 300,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators